@@ -0,0 +1,39 @@
+"""add student_progress summary table
+
+Revision ID: 3f6c2a9d1e47
+Revises: 82bb1039606f
+Create Date: 2026-10-16 10:05:12.418250
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '3f6c2a9d1e47'
+down_revision: Union[str, Sequence[str], None] = '82bb1039606f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    Populate the new table afterwards with `python -m lib rebuild-progress`.
+    """
+    op.create_table(
+        'student_progress',
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('orientacion', sa.String(), nullable=False),
+        sa.Column('completed_count', sa.Integer(), nullable=False),
+        sa.Column('planned_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['students.student_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('student_id', 'orientacion'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('student_progress')
@@ -0,0 +1,27 @@
+"""add row_hash to course_sources
+
+Revision ID: 9b1d4e7c2a05
+Revises: 3f6c2a9d1e47
+Create Date: 2026-10-16 11:42:37.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '9b1d4e7c2a05'
+down_revision: Union[str, Sequence[str], None] = '3f6c2a9d1e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('course_sources', sa.Column('row_hash', sa.String(length=40), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('course_sources', 'row_hash')
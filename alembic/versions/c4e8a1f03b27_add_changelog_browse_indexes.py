@@ -0,0 +1,30 @@
+"""add change_logs browse indexes
+
+Revision ID: c4e8a1f03b27
+Revises: 9b1d4e7c2a05
+Create Date: 2026-10-16 15:08:12.440917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = 'c4e8a1f03b27'
+down_revision: Union[str, Sequence[str], None] = '9b1d4e7c2a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_changelog_ts_id', 'change_logs', ['ts', 'id'], unique=False)
+    op.create_index('ix_changelog_user_ts', 'change_logs', ['user', 'ts'], unique=False)
+    op.create_index('ix_changelog_entidad_ts', 'change_logs', ['entidad', 'ts'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_changelog_entidad_ts', table_name='change_logs')
+    op.drop_index('ix_changelog_user_ts', table_name='change_logs')
+    op.drop_index('ix_changelog_ts_id', table_name='change_logs')
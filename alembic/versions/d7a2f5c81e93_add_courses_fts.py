@@ -0,0 +1,57 @@
+"""add courses_fts full-text search index
+
+Revision ID: d7a2f5c81e93
+Revises: c4e8a1f03b27
+Create Date: 2026-10-16 16:21:47.093518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = 'd7a2f5c81e93'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1f03b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "materia, comentarios, course_id, orientacion"
+NEW = "new.materia, new.comentarios, new.course_id, new.orientacion"
+OLD = "old.materia, old.comentarios, old.course_id, old.orientacion"
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    SQLite only (FTS5); other databases search with LIKE.
+    """
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        f"CREATE VIRTUAL TABLE courses_fts USING fts5({COLUMNS}, "
+        "content='courses', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(f"""
+        CREATE TRIGGER courses_fts_ai AFTER INSERT ON courses BEGIN
+            INSERT INTO courses_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW});
+        END""")
+    op.execute(f"""
+        CREATE TRIGGER courses_fts_ad AFTER DELETE ON courses BEGIN
+            INSERT INTO courses_fts(courses_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD});
+        END""")
+    op.execute(f"""
+        CREATE TRIGGER courses_fts_au AFTER UPDATE OF {COLUMNS} ON courses BEGIN
+            INSERT INTO courses_fts(courses_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD});
+            INSERT INTO courses_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW});
+        END""")
+    op.execute("INSERT INTO courses_fts(courses_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS courses_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS courses_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS courses_fts_ai")
+    op.execute("DROP TABLE IF EXISTS courses_fts")
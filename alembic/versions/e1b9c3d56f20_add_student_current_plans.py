@@ -0,0 +1,53 @@
+"""add student_current_plans pointer table
+
+Revision ID: e1b9c3d56f20
+Revises: d7a2f5c81e93
+Create Date: 2026-10-16 17:34:05.611284
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e1b9c3d56f20'
+down_revision: Union[str, Sequence[str], None] = 'd7a2f5c81e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    Backfills each student's current plan with the vigencia rule of
+    `metrics.refresh_current_plans`.
+    """
+    op.create_table(
+        'student_current_plans',
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('plan_version_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['students.student_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['plan_version_id'], ['plan_versions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('student_id'),
+        sa.UniqueConstraint('plan_version_id'),
+    )
+    op.execute(sa.text(
+        """
+        INSERT INTO student_current_plans (student_id, plan_version_id)
+        SELECT student_id, id FROM (
+            SELECT id, student_id,
+                   row_number() OVER (PARTITION BY student_id ORDER BY vigente_desde DESC) AS rn
+            FROM plan_versions
+            WHERE vigente_desde <= :now
+              AND (vigente_hasta IS NULL OR vigente_hasta >= :now)
+        ) ranked
+        WHERE rn = 1
+        """
+    ).bindparams(sa.bindparam('now', datetime.now(), type_=sa.DateTime())))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('student_current_plans')
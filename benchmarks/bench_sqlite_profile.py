@@ -0,0 +1,122 @@
+"""Benchmark the SQLite connection profiles of `lib/db.py`.
+
+For each profile, on a fresh database file in a temporary directory:
+- commit latency: single-row INSERT + COMMIT, repeated (mean and p95 in ms);
+- concurrent readers: one writer thread committing small transactions while
+  several reader threads run aggregate queries for a fixed duration
+  (reads/s, writes/s and "database is locked" errors).
+
+Usage:
+    python benchmarks/bench_sqlite_profile.py [--profiles default performance]
+        [--commits 500] [--readers 4] [--seconds 5]
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.db import SQLITE_PROFILES, configure_sqlite_engine, sqlite_pragmas  # noqa: E402
+
+
+def make_engine(path: Path, profile: str):
+    bench_engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=16,
+    )
+    configure_sqlite_engine(bench_engine, sqlite_pragmas(profile))
+    with bench_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE events (id INTEGER PRIMARY KEY, student_id INTEGER, payload TEXT)"))
+        conn.execute(
+            text("INSERT INTO events (student_id, payload) VALUES (:s, :p)"),
+            [{"s": i % 500, "p": "x" * 100} for i in range(20_000)],
+        )
+    return bench_engine
+
+
+def commit_latency(bench_engine, commits: int) -> list:
+    timings = []
+    for i in range(commits):
+        start = time.perf_counter()
+        with bench_engine.begin() as conn:
+            conn.execute(text("INSERT INTO events (student_id, payload) VALUES (:s, 'commit')"), {"s": i % 500})
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def concurrent_readers(bench_engine, readers: int, seconds: float) -> dict:
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            try:
+                with bench_engine.begin() as conn:
+                    conn.execute(text("INSERT INTO events (student_id, payload) VALUES (:s, 'w')"), {"s": i % 500})
+                bump("writes")
+            except OperationalError:
+                bump("locked")
+            i += 1
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with bench_engine.connect() as conn:
+                    conn.execute(text(
+                        "SELECT student_id, count(*) FROM events GROUP BY student_id ORDER BY 2 DESC LIMIT 5"
+                    )).all()
+                bump("reads")
+            except OperationalError:
+                bump("locked")
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {key: value / seconds if key != "locked" else value for key, value in counts.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES), choices=list(SQLITE_PROFILES))
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    print(f"{'profile':>12} {'commit ms':>10} {'p95 ms':>8} {'reads/s':>9} {'writes/s':>9} {'locked':>7}")
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as tmp:
+            bench_engine = make_engine(Path(tmp) / "bench.db", profile)
+            timings = commit_latency(bench_engine, args.commits)
+            mixed = concurrent_readers(bench_engine, args.readers, args.seconds)
+            bench_engine.dispose()
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(
+            f"{profile:>12} {statistics.mean(timings):>10.2f} {p95:>8.2f} "
+            f"{mixed['reads']:>9,.0f} {mixed['writes']:>9,.0f} {mixed['locked']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
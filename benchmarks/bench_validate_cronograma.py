@@ -0,0 +1,79 @@
+"""Benchmark `validate_cronograma_df` on synthetic cronograma sheets.
+
+Builds DataFrames shaped like `pd.read_excel` output for the
+CronogramaConsolidado sheet (mixed-type Horas, float Año with gaps, empty
+text columns) and reports the best of several runs per size.
+
+Usage:
+    python benchmarks/bench_validate_cronograma.py [--rows 10000 100000] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("DISABLE_PANDERA_IMPORT_WARNING", "True")
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+from lib.validators import EXPECTED_COLUMNS, validate_cronograma_df  # noqa: E402
+
+
+def make_sheet(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    idx = np.arange(rows)
+    df = pd.DataFrame({
+        "Programa": rng.choice(["MBA", "EMBA"], rows),
+        "Año": rng.choice([2024.0, 2025.0, 2026.0, np.nan], rows),
+        "Módulo": [f"Módulo {i % 6}" for i in idx],
+        "Materia": [f"Materia {i}" for i in idx],
+        "Horas": pd.Series(rng.choice([12.0, 24.0, 36.0, np.nan], rows), dtype=object),
+        "Profesor 1": [f"Profesor {i % 40}" for i in idx],
+        "Profesor 2": np.nan,
+        "Profesor 3": np.nan,
+        "Inicio": pd.Timestamp("2026-03-01") + pd.to_timedelta(idx % 200, unit="D"),
+        "Final": pd.Timestamp("2026-06-01") + pd.to_timedelta(idx % 200, unit="D"),
+        "Día": rng.choice(["Lunes", "Martes", "Miércoles", None], rows),
+        "Horario": "19:00-22:00",
+        "Formato": rng.choice(["Presencial", "Virtual"], rows),
+        "Orientación": rng.choice(["Finanzas", "Marketing", "Estrategia", None], rows),
+        "Comentarios": np.nan,
+        "TipoMateria": rng.choice(["electiva", "obligatoria"], rows),
+        "SolapaFuente": [f"Solapa{i % 12}" for i in idx],
+        "MateriaID": [f"C{i:06d}" for i in idx],
+        "MateriaKey": [f"K{i:06d}" for i in idx],
+    }, columns=EXPECTED_COLUMNS)
+    # A few unparseable numeric cells, as found in hand-edited workbooks
+    df.loc[idx % 97 == 0, "Horas"] = "a definir"
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'best (s)':>10} {'rows/s':>12} {'errors':>7}")
+    for rows in args.rows:
+        sheet = make_sheet(rows)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _, errors = validate_cronograma_df(sheet)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f"{rows:>10} {best:>10.3f} {rows / best:>12,.0f} {len(errors):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """Library helpers for the app (database, models, utilities)."""
 
-from .db import engine, SessionLocal, Base, init_db, get_session  # noqa: F401
-from .helpers import log_change  # noqa: F401
+from .db import engine, read_engine, SessionLocal, Base, init_db, get_session, get_read_session  # noqa: F401
+from .helpers import audit_batch, enable_audit, log_change  # noqa: F401
 from . import metrics  # noqa: F401
 from . import models  # noqa: F401
+from . import progress  # noqa: F401
@@ -0,0 +1,38 @@
+"""Maintenance commands.
+
+Usage:
+    python -m lib rebuild-progress
+    python -m lib archive-audit [--days N]
+"""
+
+import argparse
+
+from .audit import AUDIT_RETENTION_DAYS, archive_change_logs
+from .db import init_db
+from .progress import rebuild_student_progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m lib", description="Tareas de mantenimiento de la base de datos")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild-progress", help="Reconstruir los planes vigentes y la tabla student_progress desde cero")
+    archive = subparsers.add_parser("archive-audit", help="Archivar el ChangeLog antiguo en archivos mensuales comprimidos")
+    archive.add_argument(
+        "--days", type=int, default=AUDIT_RETENTION_DAYS,
+        help=f"Archivar registros con más de N días (por defecto {AUDIT_RETENTION_DAYS}, AUDIT_RETENTION_DAYS)",
+    )
+
+    args = parser.parse_args(argv)
+    init_db()
+
+    if args.command == "rebuild-progress":
+        print(f"student_progress reconstruida: {rebuild_student_progress()} filas")
+    elif args.command == "archive-audit":
+        archived = archive_change_logs(older_than_days=args.days)
+        for month, rows in archived.items():
+            print(f"{month}: {rows} filas archivadas")
+        print(f"ChangeLog archivado: {sum(archived.values())} filas en {len(archived)} meses")
+
+
+if __name__ == "__main__":
+    main()
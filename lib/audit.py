@@ -0,0 +1,306 @@
+"""ChangeLog browsing: filtered keyset pagination, statistics and archival.
+
+Pages are read newest first with a keyset cursor on (ts, id) instead of
+OFFSET, so every page is an index range scan no matter how deep the user
+pages: ix_changelog_ts_id, or ix_changelog_user_ts / ix_changelog_entidad_ts
+when filtering by an exact user or entidad. Statistics are GROUP BY queries.
+
+Rows older than the retention horizon (AUDIT_RETENTION_DAYS, 365 by default)
+are moved by `archive_change_logs()` (`python -m lib archive-audit`) into
+monthly gzip JSONL files under DATA_DIR/audit_archive, each with a small JSON
+summary next to it. Reads merge the live table with the archive months that
+overlap the requested date range; other months are never opened.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, func, or_, select
+from .cache import bump_tables, cached_query
+from .db import DATA_DIR, get_read_session, get_session
+from .models import ChangeLog
+
+
+AUDIT_PAGE_SIZE = 100
+
+AUDIT_COLUMNS = ["id", "ts", "user", "entidad", "entidad_id", "campo", "valor_anterior", "valor_nuevo", "motivo"]
+
+AUDIT_ARCHIVE_DIR = DATA_DIR / "audit_archive"
+AUDIT_RETENTION_DAYS = int(os.environ.get("AUDIT_RETENTION_DAYS", "365"))
+
+_ARCHIVE_PREFIX = "change_logs-"
+_ARCHIVE_SUFFIX = ".jsonl.gz"
+
+
+def _filter_conditions(filters: dict) -> list:
+    """WHERE conditions for the audit filters.
+
+    `filters` keys (all optional): desde, hasta (datetimes, inclusive),
+    user and entidad (exact values, e.g. from `audit_stats`), student_id.
+    """
+    conditions = []
+    if filters.get("desde") is not None:
+        conditions.append(ChangeLog.ts >= filters["desde"])
+    if filters.get("hasta") is not None:
+        conditions.append(ChangeLog.ts <= filters["hasta"])
+    if filters.get("user"):
+        conditions.append(ChangeLog.user == filters["user"])
+    if filters.get("entidad"):
+        conditions.append(ChangeLog.entidad == filters["entidad"])
+    if filters.get("student_id"):
+        # Logs that reference this student
+        conditions.append(or_(
+            ChangeLog.entidad_id == str(filters["student_id"]),
+            ChangeLog.entidad == "Student",
+        ))
+    return conditions
+
+
+def _row_matches(filters: dict, cursor: tuple = None):
+    """Python predicate equivalent to `_filter_conditions` (plus the cursor), for archived rows."""
+    user = filters.get("user")
+    entidad = filters.get("entidad")
+    student_id = str(filters["student_id"]) if filters.get("student_id") else None
+
+    def matches(row) -> bool:
+        if filters.get("desde") is not None and row["ts"] < filters["desde"]:
+            return False
+        if filters.get("hasta") is not None and row["ts"] > filters["hasta"]:
+            return False
+        if user and row["user"] != user:
+            return False
+        if entidad and row["entidad"] != entidad:
+            return False
+        if student_id and row["entidad_id"] != student_id and row["entidad"] != "Student":
+            return False
+        return cursor is None or (row["ts"], row["id"]) < cursor
+
+    return matches
+
+
+def audit_page(filters: dict, cursor: tuple = None, limit: int = AUDIT_PAGE_SIZE) -> tuple:
+    """One page of ChangeLog rows (live and archived), newest first.
+
+    `cursor` is the (ts, id) of the last row of the previous page (None for
+    the first page).
+
+    Returns (rows, next_cursor): rows as dicts keyed by AUDIT_COLUMNS;
+    next_cursor is None on the last page.
+    """
+    query = select(*[getattr(ChangeLog, c) for c in AUDIT_COLUMNS]).where(*_filter_conditions(filters))
+    if cursor is not None:
+        last_ts, last_id = cursor
+        query = query.where(or_(
+            ChangeLog.ts < last_ts,
+            and_(ChangeLog.ts == last_ts, ChangeLog.id < last_id),
+        ))
+    query = query.order_by(ChangeLog.ts.desc(), ChangeLog.id.desc()).limit(limit + 1)
+
+    with get_read_session() as session:
+        rows = [dict(row._mapping) for row in session.execute(query)]
+
+    archived = _archived_page(filters, cursor, limit)
+    if archived:
+        rows = sorted(rows + archived, key=lambda row: (row["ts"], row["id"]), reverse=True)
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1]["ts"], rows[-1]["id"])
+    return rows, None
+
+
+def audit_count(filters: dict) -> int:
+    """Number of ChangeLog rows (live and archived) matching the filters."""
+    with get_read_session() as session:
+        total = session.execute(
+            select(func.count(ChangeLog.id)).where(*_filter_conditions(filters))
+        ).scalar_one()
+
+    desde, hasta = filters.get("desde"), filters.get("hasta")
+    only_dates = not (filters.get("user") or filters.get("entidad") or filters.get("student_id"))
+    matches = _row_matches(filters)
+    for month, path in _archive_months(desde, hasta):
+        inside = (desde is None or desde <= month) and (hasta is None or _next_month(month) <= hasta)
+        if only_dates and inside:
+            # The whole month matches: its summary already has the count
+            total += _read_archive_summary(month)["rows"]
+        else:
+            total += sum(1 for row in _read_archive_file(path) if matches(row))
+    return total
+
+
+@cached_query("change_logs")
+def audit_stats() -> dict:
+    """Whole-log statistics (live and archived), cached until the next change.
+
+    Live rows are aggregated with GROUP BY; archived months contribute their
+    stored summaries.
+
+    Returns dict: total, by_entidad {entidad: count}, by_user {user: count}
+    (both sorted by count descending; rows without user are not counted
+    in by_user)
+    """
+    with get_read_session() as session:
+        by_entidad = dict(session.execute(
+            select(ChangeLog.entidad, func.count(ChangeLog.id)).group_by(ChangeLog.entidad)
+        ).all())
+        by_user = dict(session.execute(
+            select(ChangeLog.user, func.count(ChangeLog.id))
+            .where(and_(ChangeLog.user.isnot(None), ChangeLog.user != ""))
+            .group_by(ChangeLog.user)
+        ).all())
+
+    for month, _ in _archive_months():
+        summary = _read_archive_summary(month)
+        for key, counts in (("by_entidad", by_entidad), ("by_user", by_user)):
+            for value, n in summary[key].items():
+                counts[value] = counts.get(value, 0) + n
+
+    def by_count(counts):
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+    return {
+        "total": sum(by_entidad.values()),
+        "by_entidad": by_count(by_entidad),
+        "by_user": by_count(by_user),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Archival
+# ---------------------------------------------------------------------------
+
+def archive_change_logs(older_than_days: int = None, now: datetime = None) -> dict:
+    """Move ChangeLog rows older than the retention horizon to monthly archives.
+
+    Each month is written (merged by id with rows archived earlier) and then
+    deleted from the table in its own transaction, so an interrupted run can
+    simply be repeated.
+
+    Returns dict: {"YYYY-MM": rows archived}
+    """
+    days = AUDIT_RETENTION_DAYS if older_than_days is None else older_than_days
+    cutoff = (now or datetime.now()) - timedelta(days=days)
+    archived = {}
+
+    with get_session() as session:
+        oldest = session.execute(select(func.min(ChangeLog.ts)).where(ChangeLog.ts < cutoff)).scalar()
+        month = _month_start(oldest) if oldest is not None else cutoff
+        while month < cutoff:
+            in_month = and_(ChangeLog.ts >= month, ChangeLog.ts < min(_next_month(month), cutoff))
+            rows = [
+                dict(row._mapping)
+                for row in session.execute(
+                    select(*[getattr(ChangeLog, c) for c in AUDIT_COLUMNS])
+                    .where(in_month)
+                    .order_by(ChangeLog.ts, ChangeLog.id)
+                )
+            ]
+            if rows:
+                _write_archive_month(month, rows)
+                session.execute(delete(ChangeLog).where(in_month))
+                session.commit()
+                archived[f"{month:%Y-%m}"] = len(rows)
+            month = _next_month(month)
+
+    if archived:
+        bump_tables("change_logs")
+    return archived
+
+
+def archived_months(desde: datetime = None, hasta: datetime = None) -> list:
+    """Archived months ("YYYY-MM", newest first) overlapping [desde, hasta]."""
+    return [f"{month:%Y-%m}" for month, _ in _archive_months(desde, hasta)]
+
+
+def _month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _archive_path(month: datetime):
+    return AUDIT_ARCHIVE_DIR / f"{_ARCHIVE_PREFIX}{month:%Y-%m}{_ARCHIVE_SUFFIX}"
+
+
+def _summary_path(month: datetime):
+    return AUDIT_ARCHIVE_DIR / f"{_ARCHIVE_PREFIX}{month:%Y-%m}.json"
+
+
+def _archive_months(desde: datetime = None, hasta: datetime = None) -> list:
+    """[(month start, path)] of archive files overlapping [desde, hasta], newest first."""
+    if not AUDIT_ARCHIVE_DIR.exists():
+        return []
+    months = []
+    for path in AUDIT_ARCHIVE_DIR.glob(f"{_ARCHIVE_PREFIX}*{_ARCHIVE_SUFFIX}"):
+        month = datetime.strptime(path.name[len(_ARCHIVE_PREFIX):-len(_ARCHIVE_SUFFIX)], "%Y-%m")
+        if hasta is not None and month > hasta:
+            continue
+        if desde is not None and _next_month(month) <= desde:
+            continue
+        months.append((month, path))
+    return sorted(months, reverse=True)
+
+
+def _read_archive_file(path):
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            row = json.loads(line)
+            row["ts"] = datetime.fromisoformat(row["ts"])
+            yield row
+
+
+def _read_archive_summary(month: datetime) -> dict:
+    with open(_summary_path(month), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _archived_page(filters: dict, cursor: tuple, limit: int) -> list:
+    """Up to limit + 1 archived rows matching the filters, newest first."""
+    hasta = filters.get("hasta")
+    if cursor is not None:
+        hasta = cursor[0] if hasta is None else min(hasta, cursor[0])
+
+    rows = []
+    matches = _row_matches(filters, cursor)
+    for _, path in _archive_months(filters.get("desde"), hasta):
+        rows.extend(row for row in _read_archive_file(path) if matches(row))
+        if len(rows) > limit:
+            break  # months are disjoint: older ones can't hold newer rows
+    rows.sort(key=lambda row: (row["ts"], row["id"]), reverse=True)
+    return rows[:limit + 1]
+
+
+def _write_archive_month(month: datetime, rows: list) -> None:
+    """Merge `rows` into the month's archive file and rewrite its summary."""
+    AUDIT_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _archive_path(month)
+    merged = {row["id"]: row for row in _read_archive_file(path)} if path.exists() else {}
+    merged.update((row["id"], row) for row in rows)
+    merged = sorted(merged.values(), key=lambda row: (row["ts"], row["id"]))
+
+    by_entidad, by_user = {}, {}
+    tmp_path = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+        for row in merged:
+            fh.write(json.dumps({**row, "ts": row["ts"].isoformat()}, ensure_ascii=False) + "\n")
+            by_entidad[row["entidad"]] = by_entidad.get(row["entidad"], 0) + 1
+            if row["user"]:
+                by_user[row["user"]] = by_user.get(row["user"], 0) + 1
+    os.replace(tmp_path, path)
+
+    summary = {
+        "rows": len(merged),
+        "min_ts": merged[0]["ts"].isoformat(),
+        "max_ts": merged[-1]["ts"].isoformat(),
+        "by_entidad": by_entidad,
+        "by_user": by_user,
+    }
+    summary_path = _summary_path(month)
+    tmp_path = summary_path.with_name(summary_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(summary, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, summary_path)
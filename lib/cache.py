@@ -0,0 +1,113 @@
+"""Memoized read queries, invalidated by per-table version counters.
+
+Streamlit reruns the whole page script on every interaction, so shared reads
+(student lists, course catalogs, filter values) are cached with
+`st.cache_data` under a key that includes the current version of every table
+they read. Writers bump those versions: the `enable_audit` listener bumps the
+tables of every audited entity on commit and the imports bump the tables they
+write, so a cached result is served until the underlying data actually changes.
+
+Usage:
+    @cached_query("courses")
+    def course_programs():
+        ...
+
+Versions live in process memory (one Streamlit server process); writes made
+by another process (e.g. the CLI) are picked up after `clear_query_cache()`
+or a server restart.
+"""
+
+import threading
+import streamlit as st
+from .db import get_session
+from .models import Course, Student
+
+
+# ChangeLog.entidad -> tables written by changes to that entity
+ENTITY_TABLES = {
+    "Course": ("courses",),
+    "CourseSource": ("course_sources",),
+    "ScheduleImport": ("courses", "course_sources"),
+    "Student": ("students",),
+    "Meeting": ("meetings",),
+    "PlanVersion": ("plan_versions",),
+    "StudentPlanItem": ("student_plan_items",),
+    "Enrollment": ("enrollments",),
+}
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def table_versions(tables) -> tuple:
+    """Current version of each table, as a hashable cache key."""
+    with _versions_lock:
+        return tuple((table, _versions.get(table, 0)) for table in tables)
+
+
+def bump_tables(*tables) -> None:
+    """Invalidate cached reads of the given tables."""
+    with _versions_lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+def bump_entity(entidad: str) -> None:
+    """Invalidate cached reads of the tables behind a ChangeLog entity.
+
+    Every logged change also bumps `change_logs`.
+    """
+    bump_tables("change_logs", *ENTITY_TABLES.get(entidad, ()))
+
+
+def cached_query(*tables, max_entries: int = 32):
+    """Decorator memoizing a read function until one of `tables` changes.
+
+    Arguments of the decorated function must be hashable by `st.cache_data`
+    and its result picklable (returned values are copies, safe to mutate).
+    """
+    def decorator(fn):
+        def read(versions, *args, **kwargs):
+            return fn(*args, **kwargs)
+
+        # st.cache_data keys the cache on module + qualname + source; take the
+        # wrapped function's names so each decorated read gets its own cache
+        read.__module__ = fn.__module__
+        read.__name__ = fn.__name__
+        read.__qualname__ = fn.__qualname__
+        cached = st.cache_data(show_spinner=False, max_entries=max_entries)(read)
+
+        def wrapper(*args, **kwargs):
+            return cached(table_versions(tables), *args, **kwargs)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__qualname__ = fn.__qualname__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.clear = cached.clear
+        return wrapper
+
+    return decorator
+
+
+def clear_query_cache() -> None:
+    """Drop every cached read (e.g. after writes made outside the app)."""
+    bump_tables(*{table for tables in ENTITY_TABLES.values() for table in tables}, "change_logs")
+
+
+# ---------------------------------------------------------------------------
+# Shared cached reads
+# ---------------------------------------------------------------------------
+
+@cached_query("students")
+def list_students() -> list:
+    """All students (detached copies), ordered by student_id."""
+    with get_session() as session:
+        return session.query(Student).order_by(Student.student_id).all()
+
+
+@cached_query("courses")
+def list_courses() -> list:
+    """All courses (detached copies), ordered by id."""
+    with get_session() as session:
+        return session.query(Course).order_by(Course.id).all()
+
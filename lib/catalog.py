@@ -0,0 +1,202 @@
+"""Course catalog facets and full-text search shared by every page."""
+
+import re
+from collections import Counter
+from functools import lru_cache
+from sqlalchemy import Float, Integer, or_, select, text
+from sqlalchemy.exc import OperationalError
+from .cache import cached_query
+from .db import engine, get_session
+from .models import Course, StudentPlanItem
+
+
+# Course columns exposed as facets, in display order
+FACET_COLUMNS = ("programa", "anio", "tipo_materia", "orientacion", "formato", "dia")
+
+
+@cached_query("courses")
+def catalog_facets() -> dict:
+    """Distinct values and course counts for every facet column.
+
+    Reads only the facet columns in a single query; cached until the course
+    catalog changes (see lib/cache.py). Null and blank values are skipped.
+
+    Returns dict: {facet: {value: count}} with values in ascending order
+    """
+    columns = [getattr(Course, name) for name in FACET_COLUMNS]
+    counters = {name: Counter() for name in FACET_COLUMNS}
+    with get_session() as session:
+        for row in session.execute(select(*columns)):
+            for name, value in zip(FACET_COLUMNS, row):
+                if value is not None and value != "":
+                    counters[name][value] += 1
+    return {name: dict(sorted(counters[name].items())) for name in FACET_COLUMNS}
+
+
+def facet_values(facet: str) -> list:
+    """Sorted distinct values of one facet (for a selectbox)."""
+    return list(catalog_facets()[facet])
+
+
+# ---------------------------------------------------------------------------
+# Full-text search
+# ---------------------------------------------------------------------------
+
+# SQLite FTS5 index over the searchable course columns, kept in sync with
+# `courses` by triggers (so every import or edit updates it in the same
+# transaction). remove_diacritics folds accents: "finanzas" finds "Finanzás".
+COURSE_SEARCH_TABLE = "courses_fts"
+COURSE_SEARCH_COLUMNS = ("materia", "comentarios", "course_id", "orientacion")
+
+_SEARCH_COLUMNS_SQL = ", ".join(COURSE_SEARCH_COLUMNS)
+_SEARCH_NEW_SQL = ", ".join(f"new.{c}" for c in COURSE_SEARCH_COLUMNS)
+_SEARCH_OLD_SQL = ", ".join(f"old.{c}" for c in COURSE_SEARCH_COLUMNS)
+_SEARCH_TRIGGERS = {
+    "courses_fts_ai": f"""
+        CREATE TRIGGER courses_fts_ai AFTER INSERT ON courses BEGIN
+            INSERT INTO {COURSE_SEARCH_TABLE}(rowid, {_SEARCH_COLUMNS_SQL}) VALUES (new.id, {_SEARCH_NEW_SQL});
+        END""",
+    "courses_fts_ad": f"""
+        CREATE TRIGGER courses_fts_ad AFTER DELETE ON courses BEGIN
+            INSERT INTO {COURSE_SEARCH_TABLE}({COURSE_SEARCH_TABLE}, rowid, {_SEARCH_COLUMNS_SQL})
+            VALUES ('delete', old.id, {_SEARCH_OLD_SQL});
+        END""",
+    "courses_fts_au": f"""
+        CREATE TRIGGER courses_fts_au AFTER UPDATE OF {_SEARCH_COLUMNS_SQL} ON courses BEGIN
+            INSERT INTO {COURSE_SEARCH_TABLE}({COURSE_SEARCH_TABLE}, rowid, {_SEARCH_COLUMNS_SQL})
+            VALUES ('delete', old.id, {_SEARCH_OLD_SQL});
+            INSERT INTO {COURSE_SEARCH_TABLE}(rowid, {_SEARCH_COLUMNS_SQL}) VALUES (new.id, {_SEARCH_NEW_SQL});
+        END""",
+}
+
+
+def ensure_course_search_index() -> bool:
+    """Create the FTS5 course index and its triggers if missing (SQLite only).
+
+    The index is rebuilt from `courses` whenever it or a trigger had to be
+    (re)created, e.g. on an existing database or after `courses` was dropped.
+
+    Returns True when the index is available.
+    """
+    _has_search_index.cache_clear()
+    if engine.dialect.name != "sqlite":
+        return False
+
+    with engine.begin() as conn:
+        existing = {
+            name for (name,) in conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE name = :table OR (type = 'trigger' AND tbl_name = 'courses')"
+            ), {"table": COURSE_SEARCH_TABLE})
+        }
+        missing = [name for name in (COURSE_SEARCH_TABLE, *_SEARCH_TRIGGERS) if name not in existing]
+        if not missing:
+            return True
+        try:
+            if COURSE_SEARCH_TABLE in missing:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {COURSE_SEARCH_TABLE} USING fts5({_SEARCH_COLUMNS_SQL}, "
+                    "content='courses', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                ))
+        except OperationalError:
+            return False  # SQLite built without FTS5: search falls back to LIKE
+        for name, ddl in _SEARCH_TRIGGERS.items():
+            if name in missing:
+                conn.execute(text(ddl))
+        conn.execute(text(f"INSERT INTO {COURSE_SEARCH_TABLE}({COURSE_SEARCH_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+@lru_cache(maxsize=None)
+def _has_search_index() -> bool:
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :table"), {"table": COURSE_SEARCH_TABLE}
+        ).first() is not None
+
+
+def _match_expression(query: str) -> str:
+    """FTS5 MATCH expression: every word of `query`, as a prefix."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+def _course_search(query: str, filters: dict):
+    """SELECT Course matching `query` and `filters`, best matches first (see `search_courses`)."""
+    stmt = select(Course)
+    for column, value in (filters or {}).items():
+        if value is not None and value != "":
+            stmt = stmt.where(getattr(Course, column) == value)
+
+    match = _match_expression(query or "")
+    if match and _has_search_index():
+        hits = (
+            text(
+                f"SELECT rowid AS id, bm25({COURSE_SEARCH_TABLE}) AS rank "
+                f"FROM {COURSE_SEARCH_TABLE} WHERE {COURSE_SEARCH_TABLE} MATCH :match"
+            )
+            .bindparams(match=match)
+            .columns(id=Integer, rank=Float)
+            .subquery("hits")
+        )
+        return stmt.join(hits, hits.c.id == Course.id).order_by(hits.c.rank, Course.id)
+
+    for word in re.findall(r"\w+", query or ""):
+        stmt = stmt.where(or_(*[getattr(Course, c).ilike(f"%{word}%") for c in COURSE_SEARCH_COLUMNS]))
+    return stmt.order_by(Course.id)
+
+
+def search_courses(query: str = "", filters: dict = None, limit: int = 50) -> list:
+    """Courses matching `query`, best matches first.
+
+    Every word of `query` must appear (as a word prefix, accents ignored) in
+    materia, comentarios, course_id or orientacion. `filters` maps Course
+    columns to required values (empty values are ignored); `limit=None`
+    returns every match. Without FTS5 (e.g. Postgres) each word is matched
+    with a case-insensitive LIKE instead.
+
+    Returns a list of Course (detached)
+    """
+    stmt = _course_search(query, filters)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    with get_session() as session:
+        return session.execute(stmt).scalars().all()
+
+
+COURSE_PICKER_PAGE_SIZE = 50
+
+
+def course_picker_page(
+    plan_version_id: int,
+    query: str = "",
+    filters: dict = None,
+    page: int = 0,
+    page_size: int = COURSE_PICKER_PAGE_SIZE,
+    exclude_codes=(),
+) -> tuple:
+    """One page of the courses that can still be added to a plan version.
+
+    Courses whose course_id is already in the plan are excluded in SQL
+    (NOT EXISTS anti-join); `plan_version_id=None` skips that check (e.g. for
+    a plan that only exists in memory). Course codes in `exclude_codes` are
+    excluded too. `query` and `filters` work as in `search_courses`.
+
+    Returns (courses, has_more): the page as a list of Course (detached) and
+    whether a next page exists
+    """
+    stmt = _course_search(query, filters)
+    if plan_version_id is not None:
+        in_plan = select(StudentPlanItem.id).where(
+            StudentPlanItem.plan_version_id == plan_version_id,
+            StudentPlanItem.course_id == Course.course_id,
+        )
+        stmt = stmt.where(~in_plan.exists())
+    if exclude_codes:
+        stmt = stmt.where(Course.course_id.not_in(list(exclude_codes)))
+    stmt = stmt.offset(page * page_size).limit(page_size + 1)
+
+    with get_session() as session:
+        courses = session.execute(stmt).scalars().all()
+    return courses[:page_size], len(courses) > page_size
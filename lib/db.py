@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 
@@ -26,19 +26,118 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DATA_DIR / "app.db"
 DATABASE_URL = os.environ.get("DATABASE_URL", f"sqlite:///{DB_PATH}")
 
+# SQLite connection profile, applied as PRAGMAs on every new connection.
+# DB_SQLITE_PROFILE selects a preset ("performance" by default, "default"
+# keeps SQLite's own settings); DB_SQLITE_<PRAGMA> overrides single values,
+# e.g. DB_SQLITE_BUSY_TIMEOUT=10000 or DB_SQLITE_SYNCHRONOUS=FULL.
+SQLITE_PROFILES = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",  # readers don't block the writer (and vice versa)
+        "synchronous": "NORMAL",  # no fsync per commit in WAL mode; durable at checkpoints
+        "busy_timeout": 5000,  # ms to wait for a lock instead of "database is locked"
+        "mmap_size": 268435456,  # 256 MB memory-mapped reads
+        "cache_size": -65536,  # 64 MB page cache (negative = KiB)
+        "temp_store": "MEMORY",
+    },
+}
+SQLITE_PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "temp_store")
+
+
+def sqlite_pragmas(profile: str = None) -> dict:
+    """PRAGMA values for a profile, with DB_SQLITE_<PRAGMA> env overrides."""
+    profile = profile or os.environ.get("DB_SQLITE_PROFILE", "performance")
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown DB_SQLITE_PROFILE {profile!r}; expected one of {sorted(SQLITE_PROFILES)}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for name in SQLITE_PRAGMAS:
+        value = os.environ.get(f"DB_SQLITE_{name.upper()}")
+        if value:
+            pragmas[name] = value
+    return pragmas
+
+
+def configure_sqlite_engine(sqlite_engine, pragmas: dict) -> None:
+    """Apply `pragmas` to every connection the engine opens."""
+    if not pragmas:
+        return
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
 # Engine and session
 # For SQLite in a single-threaded Streamlit app set check_same_thread
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+if engine.dialect.name == "sqlite":
+    configure_sqlite_engine(engine, sqlite_pragmas())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
-def init_db(create_folder: bool = True):
-    """Create database file and tables.
+def _read_database_url():
+    """URL for read-only sessions.
+
+    DATABASE_READ_URL (e.g. a Postgres replica) wins; a file-based SQLite
+    database is reopened through a `mode=ro` URI; anything else reads from
+    the primary. None means reading through the primary engine itself.
+    """
+    read_url = os.environ.get("DATABASE_READ_URL")
+    if read_url:
+        return read_url
+    if engine.dialect.name == "sqlite":
+        if engine.url.database in (None, "", ":memory:"):
+            return None  # a second in-memory engine would be another database
+        return f"sqlite:///file:{Path(engine.url.database).resolve().as_posix()}?mode=ro&uri=true"
+    return engine.url
+
+
+# Read-only engine for reports and audit listings, with its own pool so long
+# dashboard queries never hold the connections (or SQLite locks) of data entry.
+# DB_READ_POOL_SIZE / DB_READ_MAX_OVERFLOW size the pool.
+DATABASE_READ_URL = _read_database_url()
+if DATABASE_READ_URL is None:
+    read_engine = engine
+else:
+    read_engine = create_engine(
+        DATABASE_READ_URL,
+        pool_size=int(os.environ.get("DB_READ_POOL_SIZE", "10")),
+        max_overflow=int(os.environ.get("DB_READ_MAX_OVERFLOW", "20")),
+        pool_pre_ping=engine.dialect.name != "sqlite",
+        **({"connect_args": {"check_same_thread": False}} if engine.dialect.name == "sqlite" else {}),
+    )
+if read_engine is not engine and read_engine.dialect.name == "sqlite":
+    # journal_mode is a write; a read-only connection follows the file's mode
+    configure_sqlite_engine(read_engine, {k: v for k, v in sqlite_pragmas().items() if k != "journal_mode"})
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+# Set once init_db has run in this process (pages call it on every rerun)
+_initialized = False
+
+
+def init_db(create_folder: bool = True, force: bool = False):
+    """Create database file and tables, once per process.
 
     - Ensures `data/` directory exists (unless `create_folder` is False).
     - Imports models (so they are registered on `Base`) and creates tables.
+    - Adds indexes declared on models whose tables already existed.
+    - Creates the full-text course search index (SQLite).
+    - Populates `student_current_plans` and `student_progress` the first
+      time either table is created.
+
+    Later calls return immediately unless `force` is set (e.g. after the
+    database file was removed). Schema changes to existing tables are left
+    to the Alembic migrations.
     """
+    global _initialized
+    if _initialized and not force:
+        return
+
     if create_folder:
         DATA_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -50,7 +149,24 @@ def init_db(create_folder: bool = True):
         # If models fail to import, raise to let caller handle
         raise
 
+    db_inspector = inspect(engine)
+    had_progress = db_inspector.has_table("student_progress") and db_inspector.has_table("student_current_plans")
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, and with them any index added later
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    from .catalog import ensure_course_search_index
+
+    ensure_course_search_index()
+
+    if not had_progress:
+        from .progress import rebuild_student_progress
+
+        rebuild_student_progress()
+
+    _initialized = True
 
 
 @contextmanager
@@ -66,3 +182,18 @@ def get_session():
         yield session
     finally:
         session.close()
+
+
+@contextmanager
+def get_read_session():
+    """Yield a session on the read-only engine (reports, audit listings).
+
+    Usage:
+        with get_read_session() as session:
+            ...
+    """
+    session = ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
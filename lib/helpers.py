@@ -1,6 +1,9 @@
+from contextlib import contextmanager
 from datetime import datetime
-from .db import get_session
-from .models import ChangeLog
+from sqlalchemy import event, insert, inspect
+from .cache import bump_entity
+from .db import SessionLocal, get_session
+from .models import ChangeLog, Enrollment, Meeting, PlanVersion, Student, StudentPlanItem
 
 
 def log_change(
@@ -12,9 +15,14 @@ def log_change(
     motivo: str = None,
     user: str = None,
 ):
-    """Log a change to ChangeLog table."""
+    """Log a change to ChangeLog table, in its own transaction.
+
+    Changes made through an ORM session are audited by `enable_audit`
+    instead. Also invalidates cached reads of the entity's tables (see
+    lib/cache.py).
+    """
     with get_session() as session:
-        log_entry = ChangeLog(
+        session.add(ChangeLog(
             ts=datetime.now(),
             user=user,
             entidad=entidad,
@@ -23,6 +31,126 @@ def log_change(
             valor_anterior=valor_anterior,
             valor_nuevo=valor_nuevo,
             motivo=motivo,
-        )
-        session.add(log_entry)
+        ))
         session.commit()
+    bump_entity(entidad)
+
+
+def _bump_after_commit(session, entities) -> None:
+    """Invalidate cached reads of `entities` once `session` commits."""
+    pending = session.info.setdefault("audit_bump_entities", set())
+    if not pending:
+        def bump_entities(session):
+            for entidad in session.info.pop("audit_bump_entities", ()):
+                bump_entity(entidad)
+
+        event.listen(session, "after_commit", bump_entities, once=True)
+    pending.update(entities)
+
+
+# ---------------------------------------------------------------------------
+# Automatic audit of ORM changes
+# ---------------------------------------------------------------------------
+
+# Audited models -> short description used for creacion/eliminacion entries.
+# Only plain column attributes are used, so no lazy loads happen during flush.
+AUDITED_MODELS = {
+    Student: lambda s: f"{s.nombre} {s.apellido} ({s.email})",
+    Meeting: lambda m: f"Reunión {m.fecha}",
+    PlanVersion: lambda p: f"v{p.version_num}",
+    StudentPlanItem: lambda i: f"{i.course_id} ({i.estado_plan})",
+    Enrollment: lambda e: f"{e.course_id} ({e.status})",
+}
+
+
+def enable_audit(session, user: str = None, motivo: str = None):
+    """Record every change to audited models flushed by `session` in ChangeLog.
+
+    Entries are written by an `after_flush` listener on the same connection,
+    so they commit (or roll back) with the change itself: one row per changed
+    attribute (old/new value), plus "creacion"/"eliminacion" rows for new and
+    deleted objects. Calling it again updates `user`/`motivo`.
+
+    Returns the session.
+    """
+    session.info["audit"] = {"user": user, "motivo": motivo}
+    return session
+
+
+@contextmanager
+def audit_batch(session, user: str = None, motivo: str = None):
+    """Audit the changes made in the block and commit them in one transaction.
+
+    The block's changes and all their ChangeLog rows (see `enable_audit`) are
+    written by a single commit on exit; nothing is written if the block
+    raises. The session's previous audit settings are restored afterwards.
+
+    Usage:
+        with get_session() as session:
+            with audit_batch(session, user="admin"):
+                student.nombre = ...
+                student.email = ...
+    """
+    previous = session.info.get("audit")
+    enable_audit(session, user=user, motivo=motivo)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if previous is None:
+            session.info.pop("audit", None)
+        else:
+            session.info["audit"] = previous
+
+
+def _audit_value(value):
+    return None if value is None else str(value)
+
+
+def _entity_id(obj) -> str:
+    # Primary key attributes are already populated for rows inserted by this flush
+    key = inspect(obj).mapper.primary_key_from_instance(obj)
+    return ",".join(str(v) for v in key)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _audit_after_flush(session, flush_context):
+    audit = session.info.get("audit")
+    if audit is None:
+        return
+
+    now = datetime.now()
+    base = {"ts": now, "user": audit["user"], "motivo": audit["motivo"]}
+    rows = []
+    for obj in session.new:
+        describe = AUDITED_MODELS.get(type(obj))
+        if describe:
+            rows.append({**base, "entidad": type(obj).__name__, "entidad_id": _entity_id(obj),
+                         "campo": "creacion", "valor_anterior": None, "valor_nuevo": describe(obj)})
+    for obj in session.dirty:
+        if type(obj) not in AUDITED_MODELS:
+            continue
+        state = inspect(obj)
+        for attr in state.mapper.column_attrs:
+            history = state.attrs[attr.key].history
+            if not history.has_changes():
+                continue
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if old == new:
+                continue
+            rows.append({**base, "entidad": type(obj).__name__, "entidad_id": _entity_id(obj),
+                         "campo": attr.key, "valor_anterior": _audit_value(old), "valor_nuevo": _audit_value(new)})
+    for obj in session.deleted:
+        describe = AUDITED_MODELS.get(type(obj))
+        if describe:
+            rows.append({**base, "entidad": type(obj).__name__, "entidad_id": _entity_id(obj),
+                         "campo": "eliminacion", "valor_anterior": describe(obj), "valor_nuevo": None})
+
+    if rows:
+        session.connection().execute(insert(ChangeLog), rows)
+        _bump_after_commit(session, {row["entidad"] for row in rows})
+
@@ -1,279 +1,544 @@
+import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
 from typing import Union
+import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import insert, update
 
 from .validators import validate_cronograma_df
+from .cache import bump_tables
 from .db import init_db, get_session
 from .models import Course, CourseSource
+from .progress import rebuild_student_progress
 
 
-def _norm_str(value):
-    if pd.isna(value):
-        return None
-    s = str(value).strip()
-    # collapse whitespace
-    s = " ".join(s.split())
-    return s if s else None
+SHEET_NAME = "CronogramaConsolidado"
 
+# Rows per bulk INSERT/UPDATE statement
+CHUNK_SIZE = 500
 
-def _norm_int(value):
-    """Convert value to int, handling NaN and invalid values."""
-    if value is None:
-        return None
-    
-    # Handle pandas/numpy NaN types
-    try:
-        if pd.isna(value):
-            return None
-    except (TypeError, ValueError):
-        pass
-    
-    # Handle numpy integer types
-    try:
-        import numpy as np
-        if isinstance(value, (np.floating, np.integer)):
-            if pd.isna(value):
-                return None
-            return int(value)
-    except ImportError:
-        pass
-    
-    try:
-        # Handle float values
-        if isinstance(value, float):
-            if pd.isna(value):
-                return None
-            return int(value)
-        return int(float(value))
-    except (ValueError, TypeError):
-        return None
-
-
-def _norm_float(value):
-    """Convert value to float, handling NaN and invalid values."""
-    if value is None:
-        return None
-    
-    # Handle pandas/numpy NaN types
-    try:
-        if pd.isna(value):
-            return None
-    except (TypeError, ValueError):
-        pass
-    
-    # Handle numpy types
-    try:
-        import numpy as np
-        if isinstance(value, (np.floating, np.integer)):
-            if pd.isna(value):
-                return None
-            result = float(value)
-            if pd.isna(result):
-                return None
-            return result
-    except ImportError:
-        pass
-    
-    try:
-        result = float(value)
-        if pd.isna(result):
-            return None
-        return result
-    except (ValueError, TypeError):
-        return None
-
-
-def _sanitize_for_db(value):
-    """Final sanitization: ensure value is either None or a valid Python type (not NaN)."""
-    if value is None:
-        return None
-    # Check for float NaN specifically
-    if isinstance(value, float) and pd.isna(value):
-        return None
-    # Check for NaN in any form
-    try:
-        if pd.isna(value):
-            return None
-    except (TypeError, ValueError):
-        pass
-    return value
+# Rows per validation/upsert chunk in streaming mode
+STREAM_CHUNK_ROWS = 2000
 
+# Course columns written by the import (besides the (course_id, orientacion) key)
+COURSE_FIELDS = [
+    "programa",
+    "anio",
+    "materia",
+    "inicio",
+    "final",
+    "dia",
+    "horario",
+    "formato",
+    "horas",
+    "tipo_materia",
+    "comentarios",
+]
+
+# Normalized values covered by a row fingerprint (everything but the row position)
+FINGERPRINT_FIELDS = ["course_id", "orientacion", *COURSE_FIELDS, "modulo", "solapa_fuente"]
+
+
+def _to_python(series: pd.Series) -> pd.Series:
+    """Object series with every missing value (NaN/NA/NaT) replaced by None."""
+    series = series.astype(object)
+    return series.where(series.notna(), None)
+
+
+def _norm_str_series(series: pd.Series) -> pd.Series:
+    """Strip and collapse whitespace; empty strings become None."""
+    s = series.astype("string").str.replace(r"\s+", " ", regex=True).str.strip()
+    return _to_python(s.where(s != ""))
+
+
+def _norm_int_series(series: pd.Series) -> pd.Series:
+    """Convert to int (truncating floats); invalid values become None."""
+    s = pd.to_numeric(series, errors="coerce")
+    return _to_python(pd.Series(np.trunc(s), index=series.index).astype("Int64"))
+
+
+def _norm_float_series(series: pd.Series) -> pd.Series:
+    """Convert to float; invalid values become None."""
+    return _to_python(pd.to_numeric(series, errors="coerce").astype("Float64"))
 
-def import_schedule_excel(uploaded_file_or_path: Union[str, bytes, os.PathLike, object]):
-    """Read sheet 'CronogramaConsolidado', validate and upsert into DB.
 
-    Returns summary dict: created_courses, updated_courses, created_sources, updated_sources, errors
+def _norm_date_series(series: pd.Series) -> pd.Series:
+    """Convert to `datetime.date`; invalid values become None."""
+    return _to_python(pd.to_datetime(series, errors="coerce").dt.date)
+
+
+def _fingerprint(values) -> str:
+    """Content hash of one normalized row."""
+    text = "\x1f".join("" if v is None else str(v) for v in values)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _normalize_frame(df: pd.DataFrame):
+    """Normalize a validated cronograma DataFrame column by column.
+
+    The index must hold each row's position in the source sheet (0 = first
+    data row), so that row_fuente (Excel row number, header included) stays
+    correct for chunks.
+
+    Returns (records, errors): one dict per valid row with Course and
+    CourseSource values plus its `row_hash`, and the list of row errors.
+    """
+    positions = df.index.to_numpy()
+    df = df.reset_index(drop=True)
+    columns = {
+        "course_id": _norm_str_series(df["MateriaID"]),
+        "programa": _norm_str_series(df["Programa"]),
+        "anio": _norm_int_series(df["Año"]),
+        "modulo": _norm_str_series(df["Módulo"]),
+        "materia": _norm_str_series(df["Materia"]),
+        "horas": _norm_float_series(df["Horas"]),
+        "inicio": _norm_date_series(df["Inicio"]),
+        "final": _norm_date_series(df["Final"]),
+        "dia": _norm_str_series(df["Día"]),
+        "horario": _norm_str_series(df["Horario"]),
+        "formato": _norm_str_series(df["Formato"]),
+        "tipo_materia": _norm_str_series(df["TipoMateria"]),
+        "orientacion": _norm_str_series(df["Orientación"]),
+        "comentarios": _norm_str_series(df["Comentarios"]),
+        "solapa_fuente": _norm_str_series(df["SolapaFuente"]),
+        "row_fuente": pd.Series(positions + 2, dtype=object),
+    }
+    normalized = pd.DataFrame(columns)
+    normalized["row_hash"] = [
+        _fingerprint(values) for values in normalized[FINGERPRINT_FIELDS].itertuples(index=False, name=None)
+    ]
+
+    missing_id = normalized["course_id"].isna().to_numpy()
+    errors = [f"Fila {idx}: MateriaID vacío" for idx in positions[missing_id]]
+    records = normalized[~missing_id].to_dict("records")
+    for record in records:
+        record["row_fuente"] = int(record["row_fuente"])
+    return records, errors
+
+
+def _load_existing_keys(session) -> dict:
+    """Preload existing Course and CourseSource keys with one query each.
+
+    Besides the upsert keys, returns the stored sources of every sheet row
+    by (solapa_fuente, row_fuente), oldest first, plus the state the import
+    fills as it reads the file: the rows and fingerprints `seen`, the last
+    Course values of every course key (`course_values`) and the course keys
+    touched by changed rows.
     """
-    summary = {
+    courses = {
+        (course_id, orientacion): id_
+        for id_, course_id, orientacion in session.query(Course.id, Course.course_id, Course.orientacion)
+    }
+    sources = {}
+    fingerprints = {}
+    for src in session.query(
+        CourseSource.id,
+        CourseSource.course_id_ref,
+        CourseSource.course_id,
+        CourseSource.solapa_fuente,
+        CourseSource.row_fuente,
+        CourseSource.modulo,
+        CourseSource.orientacion_fuente,
+        CourseSource.row_hash,
+    ).order_by(CourseSource.id):
+        sources[(src.course_id_ref, src.solapa_fuente, src.row_fuente)] = src
+        # Several sources can share a sheet row (e.g. after its course_id changed)
+        fingerprints.setdefault((src.solapa_fuente, src.row_fuente), []).append(src)
+    return {
+        "courses": courses,
+        "sources": sources,
+        "fingerprints": fingerprints,
+        "seen": set(),
+        "seen_hashes": set(),
+        "course_values": {},
+        "touched_courses": set(),
+    }
+
+
+def _chunks(items: list, size: int = CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _upsert_records(session, records: list, existing: dict, summary: dict) -> None:
+    """Bulk upsert normalized records into Course and CourseSource.
+
+    `existing` comes from `_load_existing_keys` and is kept up to date with
+    the rows inserted here, so it can be reused across chunks of one import.
+    Rows whose fingerprint matches one stored for the same sheet row write
+    no CourseSource. A Course touched by any changed row still takes its
+    values from the last row of the file with its key, changed or not, so a
+    re-import stores the same values as a clean import.
+    """
+    changed = []
+    for record in records:
+        position = (record["solapa_fuente"], record["row_fuente"])
+        key = (record["course_id"], record["orientacion"])
+        existing["seen"].add(position)
+        existing["seen_hashes"].add(record["row_hash"])
+        existing["course_values"][key] = {field: record[field] for field in COURSE_FIELDS}
+        stored = existing["fingerprints"].get(position, ())
+        if any(src.row_hash == record["row_hash"] for src in stored):
+            summary["unchanged_rows"] += 1
+        else:
+            changed.append(record)
+            existing["touched_courses"].add(key)
+
+    # --- Courses: classify changed rows against the preloaded keys
+    course_inserts = {}
+    course_updates = {}
+    for record in changed:
+        key = (record["course_id"], record["orientacion"])
+        if key in existing["courses"]:
+            course_updates[key] = existing["courses"][key]
+            summary["updated_courses"] += 1
+        elif key in course_inserts:
+            summary["updated_courses"] += 1
+        else:
+            course_inserts[key] = None
+            summary["created_courses"] += 1
+    # Unchanged rows of a touched course may come later in the file (last row wins)
+    for record in records:
+        key = (record["course_id"], record["orientacion"])
+        if key in existing["touched_courses"] and key in existing["courses"]:
+            course_updates.setdefault(key, existing["courses"][key])
+    records = changed
+
+    course_inserts = [
+        {"course_id": key[0], "orientacion": key[1], **existing["course_values"][key]} for key in course_inserts
+    ]
+    course_updates = [{"id": id_, **existing["course_values"][key]} for key, id_ in course_updates.items()]
+
+    insert_stmt = insert(Course).returning(
+        Course.id, Course.course_id, Course.orientacion, sort_by_parameter_order=True
+    )
+    for chunk in _chunks(course_inserts):
+        for id_, course_id, orientacion in session.execute(insert_stmt, chunk):
+            existing["courses"][(course_id, orientacion)] = id_
+    for chunk in _chunks(course_updates):
+        session.execute(update(Course), chunk)
+
+    # --- Sources: keyed like uq_course_source
+    source_inserts = []
+    source_updates = []
+    for record in records:
+        course_ref = existing["courses"][(record["course_id"], record["orientacion"])]
+        key = (course_ref, record["solapa_fuente"], record["row_fuente"])
+        orientacion_fuente = record["orientacion"]
+        if key not in existing["sources"]:
+            source_inserts.append({
+                "course_id_ref": course_ref,
+                "course_id": record["course_id"],
+                "solapa_fuente": record["solapa_fuente"],
+                "orientacion_fuente": orientacion_fuente,
+                "modulo": record["modulo"],
+                "row_fuente": record["row_fuente"],
+                "row_hash": record["row_hash"],
+            })
+            existing["sources"][key] = None  # inserted in this import
+            summary["created_sources"] += 1
+            continue
+
+        src = existing["sources"][key]
+        if src is None:
+            continue
+        if (orientacion_fuente and src.orientacion_fuente != orientacion_fuente) or src.modulo != record["modulo"]:
+            summary["updated_sources"] += 1
+        if src.row_hash != record["row_hash"]:
+            source_updates.append({
+                "id": src.id,
+                "orientacion_fuente": orientacion_fuente or src.orientacion_fuente,
+                "modulo": record["modulo"],
+                "row_hash": record["row_hash"],
+            })
+
+    for chunk in _chunks(source_inserts):
+        session.execute(insert(CourseSource), chunk)
+    for chunk in _chunks(source_updates):
+        session.execute(update(CourseSource), chunk)
+
+
+def _iter_sheet_chunks(uploaded_file_or_path, sheet_name: str = SHEET_NAME, chunk_size: int = STREAM_CHUNK_ROWS):
+    """Stream a sheet as DataFrame chunks without loading the whole workbook.
+
+    Uses openpyxl in read_only mode with `iter_rows(values_only=True)`, so at
+    most `chunk_size` rows are held in memory. Fully empty rows are skipped;
+    each chunk is indexed by the row's position in the sheet (0 = first data
+    row, like `pd.read_excel`).
+
+    Yields (chunk_df, total_rows); total_rows comes from the sheet dimension
+    and may be None when the file does not declare it.
+    """
+    if hasattr(uploaded_file_or_path, "seek"):
+        uploaded_file_or_path.seek(0)
+    source = uploaded_file_or_path if hasattr(uploaded_file_or_path, "read") else str(uploaded_file_or_path)
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        total_rows = sheet.max_row - 1 if sheet.max_row else None
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+        buffer, index = [], []
+        emitted = False
+        for position, values in enumerate(rows):
+            if all(v is None for v in values):
+                continue
+            buffer.append(values[:len(columns)])
+            index.append(position)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=columns, index=index), total_rows
+                buffer, index = [], []
+                emitted = True
+        if buffer or not emitted:
+            yield pd.DataFrame(buffer, columns=columns, index=index), total_rows
+    finally:
+        workbook.close()
+
+
+def _new_summary() -> dict:
+    return {
         "created_courses": 0,
         "updated_courses": 0,
         "created_sources": 0,
         "updated_sources": 0,
+        "unchanged_rows": 0,
+        "deleted_rows": [],
         "errors": [],
     }
 
 
-    # Read excel
-    try:
-        if hasattr(uploaded_file_or_path, "read"):
-            df = pd.read_excel(uploaded_file_or_path, sheet_name="CronogramaConsolidado", engine="openpyxl")
-        else:
-            df = pd.read_excel(str(uploaded_file_or_path), sheet_name="CronogramaConsolidado", engine="openpyxl")
-    except Exception as e:
-        summary["errors"].append(f"Error leyendo Excel: {e}")
-        return summary
+def _deleted_rows(existing: dict) -> list:
+    """Stored source rows of the imported sheets (solapas) missing from the file.
 
-    # Validate
-    df, errors = validate_cronograma_df(df)
-    if errors:
-        summary["errors"].extend(errors)
-        return summary
+    A row whose content still appears elsewhere in the file (it only moved)
+    is not reported. Rows with several stored sources are reported once,
+    with the course_id of the latest one.
+    """
+    solapas = {solapa for solapa, _ in existing["seen"]}
+    return [
+        {"solapa_fuente": position[0], "row_fuente": position[1], "course_id": srcs[-1].course_id}
+        for position, srcs in sorted(existing["fingerprints"].items(), key=lambda x: (x[0][0] or "", x[0][1] or 0))
+        if position[0] in solapas
+        and position not in existing["seen"]
+        and not any(src.row_hash in existing["seen_hashes"] for src in srcs)
+    ]
 
-    # Ensure DB and tables exist
+
+def _write_import(batches, summary: dict) -> dict:
+    """Upsert batches of normalized records in one transaction.
+
+    `batches` yields lists of records, or None for a chunk that failed
+    validation: nothing is then written, but the remaining batches are
+    still consumed so every error is reported at once. On success, missing
+    rows are reported, caches are invalidated and the 5/8 progress table is
+    rebuilt if courses were updated.
+    """
     init_db()
 
     with get_session() as session:
-        for idx, row in df.reset_index(drop=True).iterrows():
-            try:
-                course_id = _norm_str(row.get("MateriaID"))
-                if not course_id:
-                    summary["errors"].append(f"Fila {idx}: MateriaID vacío")
-                    continue
-
-                # Normalize fields
-                programa = _norm_str(row.get("Programa"))
-                anio = _norm_int(row.get("Año"))
-                modulo = _norm_str(row.get("Módulo"))
-                materia = _norm_str(row.get("Materia"))
-                horas = _norm_float(row.get("Horas"))
-                inicio = row.get("Inicio")
-                final = row.get("Final")
-                dia = _norm_str(row.get("Día"))
-                horario = _norm_str(row.get("Horario"))
-                formato = _norm_str(row.get("Formato"))
-                tipo_materia = _norm_str(row.get("TipoMateria"))
-                orientacion = _norm_str(row.get("Orientación"))
-                comentarios = _norm_str(row.get("Comentarios"))
-
-                # Convert dates to date only (if Timestamp)
-                if pd.notna(inicio):
-                    try:
-                        inicio = pd.to_datetime(inicio).date()
-                    except Exception:
-                        inicio = None
-                else:
-                    inicio = None
-
-                if pd.notna(final):
-                    try:
-                        final = pd.to_datetime(final).date()
-                    except Exception:
-                        final = None
-                else:
-                    final = None
-
-                # DEFENSIVE: Ensure no NaN values in numeric fields
-                if pd.isna(anio) or (isinstance(anio, float) and pd.isna(anio)):
-                    anio = None
-                if pd.isna(horas) or (isinstance(horas, float) and pd.isna(horas)):
-                    horas = None
-
-                # Sanitize all values before database operations
-                programa = _sanitize_for_db(programa)
-                anio = _sanitize_for_db(anio)
-                materia = _sanitize_for_db(materia)
-                inicio = _sanitize_for_db(inicio)
-                final = _sanitize_for_db(final)
-                dia = _sanitize_for_db(dia)
-                horario = _sanitize_for_db(horario)
-                formato = _sanitize_for_db(formato)
-                horas = _sanitize_for_db(horas)
-                tipo_materia = _sanitize_for_db(tipo_materia)
-                orientacion = _sanitize_for_db(orientacion)
-                comentarios = _sanitize_for_db(comentarios)
-
-                # Upsert Course
-                existing = (
-                    session.query(Course)
-                    .filter_by(course_id=course_id, orientacion=orientacion)
-                    .one_or_none()
-                )
-                if existing:
-                    existing.programa = programa
-                    existing.anio = anio
-                    existing.materia = materia
-                    existing.inicio = inicio
-                    existing.final = final
-                    existing.dia = dia
-                    existing.horario = horario
-                    existing.formato = formato
-                    existing.horas = horas
-                    existing.tipo_materia = tipo_materia
-                    existing.comentarios = comentarios
-                    session.merge(existing)
-                    summary["updated_courses"] += 1
-                    course_db = existing
-                else:
-                    try:
-                        new_course = Course(
-                            course_id=course_id,
-                            programa=programa,
-                            anio=anio,
-                            materia=materia,
-                            inicio=inicio,
-                            final=final,
-                            dia=dia,
-                            horario=horario,
-                            formato=formato,
-                            horas=horas,
-                            tipo_materia=tipo_materia,
-                            orientacion=orientacion,
-                            comentarios=comentarios,
-                        )
-                        session.add(new_course)
-                        session.flush()
-                        summary["created_courses"] += 1
-                        course_db = new_course
-                    except Exception as e:
-                        summary["errors"].append(f"Fila {idx}: error al crear curso: {e}")
-                        course_db = None
-
-                # Solo crear CourseSource si el curso existe y tiene id
-                if not course_db or not getattr(course_db, "id", None):
-                    summary["errors"].append(f"Fila {idx}: no se pudo crear CourseSource porque el curso no se creó correctamente (course_id={course_id}, orientacion={orientacion})")
-                    continue
-
-                # CourseSource upsert by (course_id_ref, solapa_fuente, modulo, row_fuente)
-                solapa = _norm_str(row.get("SolapaFuente"))
-                modulo_src = modulo
-                row_fuente = int(idx + 2)
-                src = (
-                    session.query(CourseSource)
-                    .filter_by(course_id_ref=course_db.id, solapa_fuente=solapa, modulo=modulo_src, row_fuente=row_fuente)
-                    .one_or_none()
-                )
-                orientacion_fuente = _norm_str(row.get("Orientación"))
-                if src:
-                    if orientacion_fuente and src.orientacion_fuente != orientacion_fuente:
-                        src.orientacion_fuente = orientacion_fuente
-                        session.merge(src)
-                        summary["updated_sources"] += 1
-                else:
-                    src = CourseSource(
-                        course_id_ref=course_db.id,
-                        course_id=course_id,
-                        solapa_fuente=solapa,
-                        orientacion_fuente=orientacion_fuente,
-                        modulo=modulo_src,
-                        row_fuente=row_fuente,
-                    )
-                    session.merge(src)
-                    summary["created_sources"] += 1
-            except Exception as e:
-                summary["errors"].append(f"Fila {idx}: error al procesar: {e}")
         try:
+            existing = _load_existing_keys(session)
+            invalid = False
+            for records in batches:
+                if records is None:
+                    invalid = True
+                elif not invalid:
+                    _upsert_records(session, records, existing, summary)
+
+            if invalid:
+                session.rollback()
+                errors = summary["errors"]
+                summary.update(_new_summary())
+                summary["errors"] = errors
+                return summary
+            summary["deleted_rows"] = _deleted_rows(existing)
             session.commit()
+            bump_tables("courses", "course_sources")
         except Exception as e:
             session.rollback()
             summary["errors"].append(f"Error al guardar en la base: {e}")
+            return summary
+
+    # Updated courses may change tipo_materia, which feeds the 5/8 progress table
+    if summary["updated_courses"]:
+        rebuild_student_progress()
     return summary
+
+
+def _frame_batches(frames, summary: dict, progress=None):
+    """Validate and normalize (chunk_df, total_rows) frames for `_write_import`.
+
+    Yields each chunk's records, or None for a chunk that failed validation.
+    """
+    rows_done = 0
+    for chunk, total_rows in frames:
+        chunk, errors = validate_cronograma_df(chunk)
+        if errors:
+            summary["errors"].extend(errors)
+            yield None
+            if chunk is None:  # missing columns: later chunks share the header
+                return
+        else:
+            records, row_errors = _normalize_frame(chunk)
+            summary["errors"].extend(row_errors)
+            yield records
+
+        rows_done += len(chunk)
+        if progress:
+            progress(rows_done, total_rows)
+
+
+def _read_bytes(uploaded_file_or_path) -> bytes:
+    if hasattr(uploaded_file_or_path, "read"):
+        if hasattr(uploaded_file_or_path, "seek"):
+            uploaded_file_or_path.seek(0)
+        return uploaded_file_or_path.read()
+    with open(str(uploaded_file_or_path), "rb") as f:
+        return f.read()
+
+
+def _parse_sheet(data: bytes, sheet_name: str) -> dict:
+    """Read, validate and normalize one source sheet (process-pool worker).
+
+    A missing or blank SolapaFuente is filled with the sheet name.
+
+    Returns dict: sheet, records, errors, valid
+    """
+    try:
+        df = pd.read_excel(BytesIO(data), sheet_name=sheet_name, engine="openpyxl")
+    except Exception as e:
+        return {"sheet": sheet_name, "records": [], "errors": [f"Solapa {sheet_name}: error leyendo hoja: {e}"], "valid": False}
+
+    df = df.dropna(how="all")  # blank rows are skipped, as in the streaming reader
+    if "SolapaFuente" in df.columns:
+        df["SolapaFuente"] = df["SolapaFuente"].fillna(sheet_name)
+    else:
+        df["SolapaFuente"] = sheet_name
+
+    df, errors = validate_cronograma_df(df)
+    if errors:
+        return {"sheet": sheet_name, "records": [], "errors": [f"Solapa {sheet_name}: {e}" for e in errors], "valid": False}
+
+    records, row_errors = _normalize_frame(df)
+    return {"sheet": sheet_name, "records": records, "errors": [f"Solapa {sheet_name}: {e}" for e in row_errors], "valid": True}
+
+
+def import_schedule_workbook(
+    uploaded_file_or_path: Union[str, bytes, os.PathLike, object],
+    sheets: list = None,
+    max_workers: int = None,
+    progress=None,
+):
+    """Import every source sheet of a workbook into Course/CourseSource.
+
+    Sheets (by default all but 'CronogramaConsolidado') are parsed and
+    validated concurrently in a process pool; the normalized rows are then
+    merged, in workbook order, into a single bulk write. Any sheet failing
+    validation aborts the write. `progress(sheets_done, total_sheets)` is
+    called as each sheet finishes parsing.
+
+    Returns the same summary dict as `import_schedule_excel`.
+    """
+    summary = _new_summary()
+
+    try:
+        data = _read_bytes(uploaded_file_or_path)
+        workbook = load_workbook(BytesIO(data), read_only=True)
+        sheet_names = list(sheets) if sheets else [n for n in workbook.sheetnames if n != SHEET_NAME]
+        workbook.close()
+    except Exception as e:
+        summary["errors"].append(f"Error leyendo Excel: {e}")
+        return summary
+
+    if not sheet_names:
+        summary["errors"].append("El archivo no tiene solapas fuente para importar")
+        return summary
+
+    results = {}
+    workers = max_workers or min(len(sheet_names), os.cpu_count() or 1)
+    if workers <= 1 or len(sheet_names) == 1:
+        for done, name in enumerate(sheet_names, 1):
+            results[name] = _parse_sheet(data, name)
+            if progress:
+                progress(done, len(sheet_names))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_parse_sheet, data, name) for name in sheet_names]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results[result["sheet"]] = result
+                if progress:
+                    progress(done, len(sheet_names))
+
+    records = []
+    invalid = False
+    for name in sheet_names:
+        summary["errors"].extend(results[name]["errors"])
+        invalid = invalid or not results[name]["valid"]
+        records.extend(results[name]["records"])
+    if invalid:
+        return summary
+
+    return _write_import([records], summary)
+
+
+def import_schedule_excel(
+    uploaded_file_or_path: Union[str, bytes, os.PathLike, object],
+    chunk_size: int = None,
+    progress=None,
+):
+    """Read sheet 'CronogramaConsolidado', validate and upsert into DB.
+
+    Rows are normalized column-wise and written with chunked bulk
+    INSERT/UPDATE statements against keys preloaded in one query per table.
+
+    Each row is fingerprinted; rows identical to the stored fingerprint of
+    the same sheet row are skipped (counted in `unchanged_rows`), and stored
+    rows of the imported solapas that are missing from the file are reported
+    in `deleted_rows` (they are not removed, since plans may reference them).
+
+    With `chunk_size`, the sheet is streamed with openpyxl read_only mode and
+    validated/upserted `chunk_size` rows at a time, so peak memory stays
+    bounded for very large workbooks. `progress(rows_done, total_rows)` is
+    called after each chunk (total_rows may be None).
+
+    In both modes fully blank rows are skipped (the other rows keep their
+    sheet position in row_fuente), so a file validates the same way
+    whatever the `chunk_size`.
+
+    Returns summary dict: created_courses, updated_courses, created_sources, updated_sources,
+    unchanged_rows, deleted_rows, errors
+    """
+    summary = _new_summary()
+
+    if chunk_size:
+        frames = _iter_sheet_chunks(uploaded_file_or_path, SHEET_NAME, chunk_size)
+        try:
+            first = next(frames)
+        except Exception as e:
+            summary["errors"].append(f"Error leyendo Excel: {e}")
+            return summary
+
+        def _all_frames():
+            yield first
+            yield from frames
+
+        return _write_import(_frame_batches(_all_frames(), summary, progress), summary)
+
+    # Read excel
+    try:
+        if hasattr(uploaded_file_or_path, "read"):
+            df = pd.read_excel(uploaded_file_or_path, sheet_name=SHEET_NAME, engine="openpyxl")
+        else:
+            df = pd.read_excel(str(uploaded_file_or_path), sheet_name=SHEET_NAME, engine="openpyxl")
+    except Exception as e:
+        summary["errors"].append(f"Error leyendo Excel: {e}")
+        return summary
+
+    df = df.dropna(how="all")
+    return _write_import(_frame_batches([(df, len(df))], summary, progress), summary)
@@ -1,35 +1,247 @@
 from datetime import datetime
-from sqlalchemy import and_, func, or_
-from .db import get_session
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, delete, exists, func, insert, or_, select, union_all
+from sqlalchemy.orm import aliased
+from .db import get_read_session, get_session
 from .models import (
     Student,
     PlanVersion,
     Enrollment,
     Course,
+    CourseSource,
+    StudentCurrentPlan,
     StudentPlanItem,
+    StudentProgress,
 )
 
 
+# Course.tipo_materia value counted by the 5/8 rule and materialized in student_progress
+ELECTIVE_TYPE = "electiva"
+
+
+def _vigente_condition(plan, now: datetime):
+    """`plan` (PlanVersion or an alias) is vigente at `now`."""
+    return and_(
+        plan.vigente_desde <= now,
+        or_(plan.vigente_hasta.is_(None), plan.vigente_hasta >= now),
+    )
+
+
+def _vigente_plan_ids_subquery(now: datetime, *conditions):
+    """Subquery of (id, student_id) of each student's PlanVersion vigente at `now`.
+
+    A version is vigente when `vigente_desde <= now` and `vigente_hasta` is
+    empty or not yet reached; if several are, the latest `vigente_desde` wins.
+    `conditions` further restrict the PlanVersion rows considered.
+    """
+    ranked = (
+        select(
+            PlanVersion.id.label("id"),
+            PlanVersion.student_id.label("student_id"),
+            func.row_number().over(
+                partition_by=PlanVersion.student_id,
+                order_by=PlanVersion.vigente_desde.desc(),
+            ).label("rn"),
+        )
+        .where(_vigente_condition(PlanVersion, now), *conditions)
+        .subquery()
+    )
+    return select(ranked.c.id, ranked.c.student_id).where(ranked.c.rn == 1).subquery()
+
+
+def refresh_current_plans(conn, student_ids=None) -> None:
+    """Recompute the student_current_plans pointers on `conn`.
+
+    `student_ids` restricts the refresh; None rebuilds every pointer. Called
+    from the flush listener in lib/progress.py whenever a PlanVersion is
+    added, changed or deleted. Readers check the pointers against the
+    vigencia dates (see `current_plan_ids_subquery`), so a version whose
+    vigencia starts or ends later is still picked up on time.
+    """
+    vigente = _vigente_plan_ids_subquery(datetime.now())
+    query = select(vigente.c.student_id, vigente.c.id)
+    clear = delete(StudentCurrentPlan)
+    if student_ids is not None:
+        student_ids = sorted(set(student_ids))
+        if not student_ids:
+            return
+        query = query.where(vigente.c.student_id.in_(student_ids))
+        clear = clear.where(StudentCurrentPlan.student_id.in_(student_ids))
+
+    rows = [{"student_id": sid, "plan_version_id": plan_id} for sid, plan_id in conn.execute(query)]
+    conn.execute(clear)
+    if rows:
+        conn.execute(insert(StudentCurrentPlan), rows)
+
+
+def current_plan_ids_subquery(now: datetime = None, student_ids=None):
+    """Subquery of (id, student_id) for every student's current (vigente) PlanVersion.
+
+    The student_current_plans pointers are the fast path: a pointer is used
+    when its version is vigente at `now` (default: the current time) and no
+    version of the student that started later is. Students whose pointer
+    fails that check, or who have none, fall back to evaluating the vigencia
+    dates of their versions. `student_ids` restricts both branches.
+    """
+    now = now or datetime.now()
+    later = aliased(PlanVersion)
+    valid_pointers = (
+        select(PlanVersion.id.label("id"), PlanVersion.student_id.label("student_id"))
+        .join(StudentCurrentPlan, StudentCurrentPlan.plan_version_id == PlanVersion.id)
+        .where(
+            _vigente_condition(PlanVersion, now),
+            ~exists().where(and_(
+                later.student_id == PlanVersion.student_id,
+                later.vigente_desde > PlanVersion.vigente_desde,
+                _vigente_condition(later, now),
+            )),
+        )
+    )
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        valid_pointers = valid_pointers.where(PlanVersion.student_id.in_(student_ids))
+    fallback = _vigente_plan_ids_subquery(
+        now,
+        PlanVersion.student_id.not_in(valid_pointers.with_only_columns(PlanVersion.student_id)),
+        *([PlanVersion.student_id.in_(student_ids)] if student_ids is not None else []),
+    )
+    return union_all(valid_pointers, select(fallback.c.id, fallback.c.student_id)).subquery()
+
+
+def stale_current_plans(student_ids=None, now: datetime = None) -> set:
+    """Students whose student_current_plans pointer no longer names their vigente version.
+
+    Returns set of student_id (including students missing a pointer they
+    should have, or holding one they should not)
+    """
+    current = current_plan_ids_subquery(now, student_ids)
+    pointers = select(StudentCurrentPlan.student_id, StudentCurrentPlan.plan_version_id)
+    if student_ids is not None:
+        pointers = pointers.where(StudentCurrentPlan.student_id.in_(list(student_ids)))
+    with get_read_session() as session:
+        stored = dict(session.execute(pointers).all())
+        vigente = dict(session.execute(select(current.c.student_id, current.c.id)).all())
+    return {sid for sid in stored.keys() | vigente.keys() if stored.get(sid) != vigente.get(sid)}
+
+
 def get_current_plan(student_id: int):
     """Get the current (vigente) PlanVersion for a student.
 
     Returns PlanVersion if found, None otherwise.
     """
+    current = current_plan_ids_subquery(student_ids=[student_id])
     with get_session() as session:
-        plan = (
-            session.query(PlanVersion)
+        return session.execute(
+            select(PlanVersion).join(current, PlanVersion.id == current.c.id)
+        ).scalar_one_or_none()
+
+
+def _student_ids_query(session, cohort: str = None, program: str = None):
+    """Build a query of student ids, optionally restricted to a cohort and/or program."""
+    query = session.query(Student.student_id)
+    if cohort is not None:
+        query = query.filter(Student.cohorte == cohort)
+    if program is not None:
+        query = query.filter(Student.programa == program)
+    return query.order_by(Student.student_id)
+
+
+def elective_counts_by_student(
+    student_ids=None,
+    cohort: str = None,
+    program: str = None,
+    elective_type: str = "electiva",
+) -> dict:
+    """Count completed electives per orientation for many students at once.
+
+    For the default elective type the counts are read from the materialized
+    `student_progress` table; any other type runs a single GROUP BY over
+    Enrollment joined to Course. Either way it is one query instead of one
+    per student. Students can be given explicitly with `student_ids`, or
+    selected by `cohort`/`program`; with neither, the whole student body is
+    used.
+
+    Returns dict: {student_id: {orientation: count}} (students without
+    completed electives map to an empty dict)
+    """
+    with get_read_session() as session:
+        if student_ids is not None:
+            student_ids = list(student_ids)
+            counts = {sid: {} for sid in student_ids}
+            if not student_ids:
+                return counts
+            student_select = student_ids
+        else:
+            students_q = _student_ids_query(session, cohort, program)
+            counts = {sid: {} for (sid,) in students_q.all()}
+            if not counts:
+                return counts
+            student_select = students_q.subquery().select()
+
+        if elective_type == ELECTIVE_TYPE:
+            rows = (
+                session.query(StudentProgress.student_id, StudentProgress.orientacion, StudentProgress.completed_count)
+                .filter(and_(
+                    StudentProgress.student_id.in_(student_select),
+                    StudentProgress.completed_count > 0,
+                ))
+                # "sin_orientacion" first, like NULL in the GROUP BY below
+                .order_by(
+                    StudentProgress.student_id,
+                    case((StudentProgress.orientacion == "sin_orientacion", 0), else_=1),
+                    StudentProgress.orientacion,
+                )
+                .all()
+            )
+            for sid, orient, count in rows:
+                counts.setdefault(sid, {})[orient] = count
+            return counts
+
+        rows = (
+            session.query(Enrollment.student_id, Course.orientacion, func.count(Enrollment.id))
+            .join(Course, Enrollment.course_id_ref == Course.id)
             .filter(and_(
-                PlanVersion.student_id == student_id,
-                PlanVersion.vigente_desde <= datetime.now(),
-                or_(
-                    PlanVersion.vigente_hasta.is_(None),
-                    PlanVersion.vigente_hasta >= datetime.now(),
-                ),
+                Enrollment.student_id.in_(student_select),
+                Enrollment.status == "completed",
+                Course.tipo_materia == elective_type,
             ))
-            .order_by(PlanVersion.vigente_desde.desc())
-            .first()
+            .group_by(Enrollment.student_id, Course.orientacion)
+            .order_by(Enrollment.student_id, Course.orientacion)
+            .all()
         )
-        return plan
+        for sid, orient, count in rows:
+            counts.setdefault(sid, {})[orient or "sin_orientacion"] = count
+        return counts
+
+
+def compliance_by_student(
+    student_ids=None,
+    cohort: str = None,
+    program: str = None,
+    elective_type: str = "electiva",
+    required_count: int = 5,
+) -> dict:
+    """Evaluate the 5/8 rule for many students in one pass.
+
+    Selection arguments are the same as `elective_counts_by_student`.
+
+    Returns dict: {student_id: {ok, best_orientation, best_count, total_completed, counts}}
+    """
+    result = {}
+    for sid, counts in elective_counts_by_student(student_ids, cohort, program, elective_type).items():
+        if counts:
+            best_orient, best_count = max(counts.items(), key=lambda x: x[1])
+        else:
+            best_orient, best_count = None, 0
+        result[sid] = {
+            "ok": best_count >= required_count,
+            "best_orientation": best_orient,
+            "best_count": best_count,
+            "total_completed": sum(counts.values()),
+            "counts": counts,
+        }
+    return result
 
 
 def count_electives_completed(student_id: int, elective_type: str = "electiva") -> int:
@@ -42,18 +254,7 @@ def count_electives_completed(student_id: int, elective_type: str = "electiva")
     Returns:
         Count of completed electives
     """
-    with get_session() as session:
-        count = (
-            session.query(func.count(Enrollment.id))
-            .join(Course, Enrollment.course_id_ref == Course.id)
-            .filter(and_(
-                Enrollment.student_id == student_id,
-                Enrollment.status == "completed",
-                Course.tipo_materia == elective_type,
-            ))
-            .scalar()
-        )
-        return count or 0
+    return sum(elective_counts_by_orientation(student_id, elective_type).values())
 
 
 def elective_counts_by_orientation(student_id: int, elective_type: str = "electiva") -> dict:
@@ -61,19 +262,7 @@ def elective_counts_by_orientation(student_id: int, elective_type: str = "electi
 
     Returns dict: {orientation: count}
     """
-    with get_session() as session:
-        rows = (
-            session.query(Course.orientacion, func.count(Enrollment.id))
-            .join(Enrollment, Enrollment.course_id_ref == Course.id)
-            .filter(and_(
-                Enrollment.student_id == student_id,
-                Enrollment.status == "completed",
-                Course.tipo_materia == elective_type,
-            ))
-            .group_by(Course.orientacion)
-            .all()
-        )
-        return {orient or "sin_orientacion": count for orient, count in rows}
+    return elective_counts_by_student([student_id], elective_type=elective_type)[student_id]
 
 
 def check_rule_5_of_8(student_id: int, elective_type: str = "electiva", required_count: int = 5) -> tuple:
@@ -91,6 +280,51 @@ def check_rule_5_of_8(student_id: int, elective_type: str = "electiva", required
     return (ok, best_orient_name, best_count)
 
 
+RISK_SCORE_COLUMNS = ["total_completed", "gap_to_target", "best_orientation", "best_count", "risk_level"]
+
+
+def risk_scores(
+    student_ids=None,
+    elective_type: str = "electiva",
+    target_count: int = 5,
+    counts: dict = None,
+) -> pd.DataFrame:
+    """Vectorized risk scoring for many students.
+
+    Orientation counts come from one `elective_counts_by_student` query (or
+    from `counts`, an already fetched result of it); the scores are then
+    derived with column operations instead of per-student Python loops.
+
+    Returns DataFrame indexed by student_id with columns:
+        total_completed, gap_to_target, best_orientation, best_count, risk_level
+    """
+    if counts is None:
+        counts = elective_counts_by_student(student_ids, elective_type=elective_type)
+
+    index = pd.Index(list(counts.keys()), name="student_id")
+    long = pd.DataFrame(
+        [(sid, orient, n) for sid, by_orient in counts.items() for orient, n in by_orient.items()],
+        columns=["student_id", "orientation", "count"],
+    )
+
+    # idxmax keeps the first maximum, matching max() over the counts dict
+    best = long.loc[long.groupby("student_id")["count"].idxmax()].set_index("student_id")
+    total = long.groupby("student_id")["count"].sum()
+
+    df = pd.DataFrame(index=index)
+    df["total_completed"] = total.reindex(index, fill_value=0).astype(int)
+    df["best_count"] = best["count"].reindex(index, fill_value=0).astype(int)
+    df["best_orientation"] = best["orientation"].reindex(index).astype(object)
+    df["best_orientation"] = df["best_orientation"].where(df["best_orientation"].notna(), None)
+    df["gap_to_target"] = np.maximum(target_count - df["best_count"].to_numpy(), 0)
+    df["risk_level"] = np.select(
+        [df["gap_to_target"].to_numpy() == 0, df["gap_to_target"].to_numpy() <= 2],
+        ["low", "medium"],
+        default="high",
+    )
+    return df[RISK_SCORE_COLUMNS]
+
+
 def risk_score(student_id: int, elective_type: str = "electiva", target_count: int = 5) -> dict:
     """Simple risk scoring for a student.
 
@@ -101,68 +335,49 @@ def risk_score(student_id: int, elective_type: str = "electiva", target_count: i
         - best_count: best count achieved
         - risk_level: 'low' if ok, 'medium' if close, 'high' if far
     """
-    counts = elective_counts_by_orientation(student_id, elective_type)
-    total = sum(counts.values())
+    row = risk_scores([student_id], elective_type, target_count).loc[student_id]
+    return {
+        "total_completed": int(row["total_completed"]),
+        "gap_to_target": int(row["gap_to_target"]),
+        "best_orientation": row["best_orientation"],
+        "best_count": int(row["best_count"]),
+        "risk_level": row["risk_level"],
+    }
 
-    if not counts:
+
+def _aggregate_compliance(compliance: dict) -> dict:
+    """Reduce `compliance_by_student` output to group-level stats."""
+    total = len(compliance)
+    if not total:
         return {
-            "total_completed": 0,
-            "gap_to_target": target_count,
-            "best_orientation": None,
-            "best_count": 0,
-            "risk_level": "high",
+            "total_students": 0,
+            "rule_5_8_compliant": 0,
+            "avg_electives_completed": 0.0,
         }
 
-    best_orient, best_count = max(counts.items(), key=lambda x: x[1])
-    gap = max(0, target_count - best_count)
-
-    if gap == 0:
-        risk_level = "low"
-    elif gap <= 2:
-        risk_level = "medium"
-    else:
-        risk_level = "high"
+    compliant_count = sum(1 for c in compliance.values() if c["ok"])
+    best_orientations = {}
+    for c in compliance.values():
+        if c["best_orientation"] is not None:
+            best_orientations[c["best_orientation"]] = best_orientations.get(c["best_orientation"], 0) + 1
 
     return {
-        "total_completed": total,
-        "gap_to_target": gap,
-        "best_orientation": best_orient,
-        "best_count": best_count,
-        "risk_level": risk_level,
+        "total_students": total,
+        "rule_5_8_compliant": compliant_count,
+        "rule_5_8_compliance_rate": compliant_count / total,
+        "avg_electives_completed": sum(c["total_completed"] for c in compliance.values()) / total,
+        "best_orientation_distribution": best_orientations,
     }
 
 
 def aggregated_metrics_by_cohort(cohort: str, elective_type: str = "electiva") -> dict:
     """Aggregate metrics for all students in a cohort.
 
-    Returns dict with stats: total_students, rule_5_8_compliant, avg_electives_completed, by_orientation_avg
+    Returns dict with stats: total_students, rule_5_8_compliant, rule_5_8_compliance_rate,
+    avg_electives_completed, best_orientation_distribution
     """
-    with get_session() as session:
-        students = session.query(Student.student_id).filter(Student.cohorte == cohort).all()
-        student_ids = [s[0] for s in students]
-
-        if not student_ids:
-            return {
-                "cohort": cohort,
-                "total_students": 0,
-                "rule_5_8_compliant": 0,
-                "avg_electives_completed": 0.0,
-            }
-
-        compliant_count = sum(
-            1 for sid in student_ids if check_rule_5_of_8(sid, elective_type)[0]
-        )
-        avg_completed = sum(
-            count_electives_completed(sid, elective_type) for sid in student_ids
-        ) / len(student_ids)
-
-        return {
-            "cohort": cohort,
-            "total_students": len(student_ids),
-            "rule_5_8_compliant": compliant_count,
-            "rule_5_8_compliance_rate": compliant_count / len(student_ids),
-            "avg_electives_completed": avg_completed,
-        }
+    compliance = compliance_by_student(cohort=cohort, elective_type=elective_type)
+    return {"cohort": cohort, **_aggregate_compliance(compliance)}
 
 
 def aggregated_metrics_by_program(program: str, elective_type: str = "electiva") -> dict:
@@ -170,29 +385,99 @@ def aggregated_metrics_by_program(program: str, elective_type: str = "electiva")
 
     Returns dict with stats
     """
-    with get_session() as session:
-        students = session.query(Student.student_id).filter(Student.programa == program).all()
-        student_ids = [s[0] for s in students]
+    compliance = compliance_by_student(program=program, elective_type=elective_type)
+    return {"program": program, **_aggregate_compliance(compliance)}
 
-        if not student_ids:
-            return {
-                "program": program,
-                "total_students": 0,
-                "rule_5_8_compliant": 0,
-                "avg_electives_completed": 0.0,
-            }
-
-        compliant_count = sum(
-            1 for sid in student_ids if check_rule_5_of_8(sid, elective_type)[0]
+
+COURSE_DEMAND_COLUMNS = ["course_id", "materia", "programa", "anio", "tipo_materia", "orientacion", "planned_students"]
+
+
+def course_demand(filters: dict = None, now: datetime = None) -> pd.DataFrame:
+    """Students planning each course in their current (vigente) plan.
+
+    Only 'planned' items of each student's current plan count (same semantics
+    as `get_current_plan`). `filters` may restrict the courses by any of
+    programa, anio, tipo_materia, orientacion; empty values are ignored.
+    Filtering and the per-course count run in the database.
+
+    Returns DataFrame with columns: course_id, materia, programa, anio,
+    tipo_materia, orientacion, planned_students (sorted by planned_students
+    descending, then course_id)
+    """
+    current_plans = current_plan_ids_subquery(now)
+    planned_students = func.count(func.distinct(current_plans.c.student_id)).label("planned_students")
+    query = (
+        select(
+            Course.course_id,
+            Course.materia,
+            Course.programa,
+            Course.anio,
+            Course.tipo_materia,
+            Course.orientacion,
+            planned_students,
         )
-        avg_completed = sum(
-            count_electives_completed(sid, elective_type) for sid in student_ids
-        ) / len(student_ids)
+        .join(StudentPlanItem, StudentPlanItem.course_id_ref == Course.id)
+        .join(current_plans, StudentPlanItem.plan_version_id == current_plans.c.id)
+        .where(StudentPlanItem.estado_plan == "planned")
+        .group_by(Course.id)
+        .order_by(planned_students.desc(), Course.course_id)
+    )
+    for column, value in (filters or {}).items():
+        if value in (None, ""):
+            continue
+        if column == "anio":
+            value = int(value)
+        query = query.where(getattr(Course, column) == value)
 
-        return {
-            "program": program,
-            "total_students": len(student_ids),
-            "rule_5_8_compliant": compliant_count,
-            "rule_5_8_compliance_rate": compliant_count / len(student_ids),
-            "avg_electives_completed": avg_completed,
-        }
+    with get_read_session() as session:
+        rows = session.execute(query).all()
+    return pd.DataFrame(rows, columns=COURSE_DEMAND_COLUMNS)
+
+
+TEMPORAL_DEMAND_COLUMNS = ["modulo", "mes_inicio", "demanda"]
+
+
+def temporal_demand() -> pd.DataFrame:
+    """Planned demand by source módulo and course start month.
+
+    Each CourseSource row contributes the number of 'planned' plan items of
+    its course. Computed with one grouped query (plan items are counted per
+    course in a subquery, then summed per módulo and start date); months are
+    labelled "%B %Y", or "Sin fecha" without start date.
+
+    Returns DataFrame with columns: modulo, mes_inicio, demanda (sorted by
+    demanda descending, ties in source order)
+    """
+    with get_read_session() as session:
+        planned = (
+            select(
+                StudentPlanItem.course_id_ref.label("course_id_ref"),
+                func.count(StudentPlanItem.id).label("planned_count"),
+            )
+            .where(StudentPlanItem.estado_plan == "planned")
+            .group_by(StudentPlanItem.course_id_ref)
+            .subquery()
+        )
+        rows = session.execute(
+            select(
+                CourseSource.modulo,
+                Course.inicio,
+                func.sum(planned.c.planned_count),
+                func.min(CourseSource.id),
+            )
+            .join(Course, CourseSource.course_id_ref == Course.id)
+            .join(planned, planned.c.course_id_ref == Course.id)
+            .group_by(CourseSource.modulo, Course.inicio)
+        ).all()
+
+    demand = {}
+    for modulo, inicio, count, first_source_id in rows:
+        key = (modulo or "Sin módulo", inicio.strftime("%B %Y") if inicio else "Sin fecha")
+        total, first = demand.get(key, (0, first_source_id))
+        demand[key] = (total + count, min(first, first_source_id))
+
+    ordered = sorted(demand.items(), key=lambda x: (-x[1][0], x[1][1]))
+    return pd.DataFrame(
+        [(modulo, mes, total) for (modulo, mes), (total, _) in ordered],
+        columns=TEMPORAL_DEMAND_COLUMNS,
+    )
@@ -47,6 +47,7 @@ class CourseSource(Base):
     orientacion_fuente = Column(String, nullable=True)
     modulo = Column(String, nullable=True)
     row_fuente = Column(Integer, nullable=True)
+    row_hash = Column(String(40), nullable=True)  # Fingerprint of the imported row (lib/io_excel.py)
 
     course = relationship("Course", backref="sources")
 
@@ -121,6 +122,25 @@ class Enrollment(Base):
     course = relationship("Course")
 
 
+class StudentProgress(Base):
+    """Denormalized elective progress per student and orientation (see lib/progress.py)."""
+
+    __tablename__ = "student_progress"
+    student_id = Column(Integer, ForeignKey("students.student_id", ondelete="CASCADE"), primary_key=True)
+    orientacion = Column(String, primary_key=True)  # "sin_orientacion" when the course has none
+    completed_count = Column(Integer, nullable=False, default=0)
+    planned_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class StudentCurrentPlan(Base):
+    """Each student's current (vigente) PlanVersion, maintained on write (see lib/metrics.py)."""
+
+    __tablename__ = "student_current_plans"
+    student_id = Column(Integer, ForeignKey("students.student_id", ondelete="CASCADE"), primary_key=True)
+    plan_version_id = Column(Integer, ForeignKey("plan_versions.id", ondelete="CASCADE"), nullable=False, unique=True)
+
+
 class ChangeLog(Base):
     __tablename__ = "change_logs"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -133,4 +153,10 @@ class ChangeLog(Base):
     valor_nuevo = Column(Text, nullable=True)
     motivo = Column(Text, nullable=True)
 
-    __table_args__ = (Index("ix_changelog_entidad", "entidad", "entidad_id"),)
+    __table_args__ = (
+        Index("ix_changelog_entidad", "entidad", "entidad_id"),
+        # Audit browser: keyset pagination on (ts, id) and filtered listings
+        Index("ix_changelog_ts_id", "ts", "id"),
+        Index("ix_changelog_user_ts", "user", "ts"),
+        Index("ix_changelog_entidad_ts", "entidad", "ts"),
+    )
@@ -0,0 +1,177 @@
+"""Materialized per-student elective progress (`student_progress` table).
+
+Each row holds, for one student and orientation, the number of completed
+elective enrollments and the number of electives planned in the student's
+current plan. Rows are refreshed incrementally from a session `after_flush`
+listener whenever an Enrollment, StudentPlanItem or PlanVersion changes, so
+dashboards read O(students) rows instead of joining every enrollment. The
+same listener first refreshes the students' current-plan pointers
+(`student_current_plans`, see `metrics.refresh_current_plans`).
+
+Full rebuild of both (e.g. after a bulk import or a migration):
+    python -m lib rebuild-progress
+"""
+
+from datetime import datetime
+from sqlalchemy import and_, delete, event, func, insert, select
+from .db import SessionLocal, get_session
+from .models import (
+    Course,
+    Enrollment,
+    PlanVersion,
+    Student,
+    StudentCurrentPlan,
+    StudentPlanItem,
+    StudentProgress,
+)
+from .metrics import ELECTIVE_TYPE, current_plan_ids_subquery, refresh_current_plans, stale_current_plans
+
+
+def orientation_label(orientacion):
+    """Orientation key used in counts: the orientacion, or "sin_orientacion"."""
+    return orientacion or "sin_orientacion"
+
+
+def _compute_progress_rows(conn, student_ids=None) -> list:
+    """Compute student_progress rows from the raw tables.
+
+    `student_ids` restricts the computation; None means every student.
+    """
+    now = datetime.now()
+    completed_q = (
+        select(Enrollment.student_id, Course.orientacion, func.count(Enrollment.id))
+        .join(Course, Enrollment.course_id_ref == Course.id)
+        .where(and_(
+            Enrollment.status == "completed",
+            Course.tipo_materia == ELECTIVE_TYPE,
+        ))
+        .group_by(Enrollment.student_id, Course.orientacion)
+    )
+    current_plans = current_plan_ids_subquery(now, student_ids)
+    planned_q = (
+        select(current_plans.c.student_id, Course.orientacion, func.count(StudentPlanItem.id))
+        .join(StudentPlanItem, StudentPlanItem.plan_version_id == current_plans.c.id)
+        .join(Course, StudentPlanItem.course_id_ref == Course.id)
+        .where(and_(
+            StudentPlanItem.estado_plan == "planned",
+            Course.tipo_materia == ELECTIVE_TYPE,
+        ))
+        .group_by(current_plans.c.student_id, Course.orientacion)
+    )
+    if student_ids is not None:
+        completed_q = completed_q.where(Enrollment.student_id.in_(student_ids))
+
+    rows = {}
+    for sid, orient, count in conn.execute(completed_q):
+        key = (sid, orientation_label(orient))
+        rows.setdefault(key, {"completed_count": 0, "planned_count": 0})
+        rows[key]["completed_count"] += count
+    for sid, orient, count in conn.execute(planned_q):
+        key = (sid, orientation_label(orient))
+        rows.setdefault(key, {"completed_count": 0, "planned_count": 0})
+        rows[key]["planned_count"] += count
+
+    return [
+        {"student_id": sid, "orientacion": orient, "updated_at": now, **values}
+        for (sid, orient), values in rows.items()
+    ]
+
+
+def refresh_student_progress(conn, student_ids) -> None:
+    """Recompute the student_progress rows of the given students on `conn`."""
+    student_ids = sorted(set(student_ids))
+    if not student_ids:
+        return
+    rows = _compute_progress_rows(conn, student_ids)
+    conn.execute(delete(StudentProgress).where(StudentProgress.student_id.in_(student_ids)))
+    if rows:
+        conn.execute(insert(StudentProgress), rows)
+
+
+def rebuild_student_progress() -> int:
+    """Rebuild the current-plan pointers and the whole student_progress table.
+
+    Returns the number of student_progress rows written.
+    """
+    with get_session() as session:
+        conn = session.connection()
+        refresh_current_plans(conn)
+        rows = _compute_progress_rows(conn)
+        conn.execute(delete(StudentProgress))
+        if rows:
+            conn.execute(insert(StudentProgress), rows)
+        session.commit()
+        return len(rows)
+
+
+def get_student_progress(student_ids) -> dict:
+    """Read materialized progress for the given students.
+
+    Planned counts of students whose current plan changed since the rows
+    were written (a vigencia that started or ended later, see
+    `metrics.stale_current_plans`) are recomputed on the fly.
+
+    Returns dict: {student_id: {orientation: {"completed": int, "planned": int}}}
+    """
+    student_ids = list(student_ids)
+    progress = {sid: {} for sid in student_ids}
+    if not student_ids:
+        return progress
+    stale = stale_current_plans(student_ids)
+    with get_session() as session:
+        rows = (
+            session.query(StudentProgress)
+            .filter(StudentProgress.student_id.in_(student_ids))
+            .order_by(StudentProgress.student_id, StudentProgress.orientacion)
+            .all()
+        )
+        for row in rows:
+            progress.setdefault(row.student_id, {})[row.orientacion] = {
+                "completed": row.completed_count,
+                "planned": 0 if row.student_id in stale else row.planned_count,
+            }
+        if stale:
+            for row in _compute_progress_rows(session.connection(), sorted(stale)):
+                if row["planned_count"]:
+                    counts = progress[row["student_id"]].setdefault(row["orientacion"], {"completed": 0, "planned": 0})
+                    counts["planned"] = row["planned_count"]
+    return progress
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _refresh_progress_after_flush(session, flush_context):
+    """Keep current-plan pointers and student_progress current for every student touched by the flush."""
+    student_ids = set()
+    plan_students = set()
+    plan_version_ids = set()
+    removed_students = set()
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Enrollment):
+            student_ids.add(obj.student_id)
+        elif isinstance(obj, StudentPlanItem):
+            plan_version_ids.add(obj.plan_version_id)
+        elif isinstance(obj, PlanVersion):
+            student_ids.add(obj.student_id)
+            plan_students.add(obj.student_id)
+        elif isinstance(obj, Student) and obj in session.deleted:
+            removed_students.add(obj.student_id)
+
+    if not (student_ids or plan_version_ids or removed_students):
+        return
+
+    conn = session.connection()
+    if plan_version_ids:
+        student_ids.update(
+            sid for (sid,) in conn.execute(
+                select(PlanVersion.student_id).where(PlanVersion.id.in_(plan_version_ids))
+            )
+        )
+    student_ids.discard(None)
+    plan_students.discard(None)
+    if removed_students:
+        conn.execute(delete(StudentCurrentPlan).where(StudentCurrentPlan.student_id.in_(removed_students)))
+        conn.execute(delete(StudentProgress).where(StudentProgress.student_id.in_(removed_students)))
+    refresh_current_plans(conn, plan_students - removed_students)
+    refresh_student_progress(conn, student_ids - removed_students)
+
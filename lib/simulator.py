@@ -0,0 +1,235 @@
+"""In-memory what-if plan simulation for the Rutas page.
+
+`PlanSimulation.load` reads the student's completed enrollments and current
+plan once (one snapshot query). Adding, removing, swapping or re-labelling
+items then only updates the counters of the affected orientation, so the 5/8
+gaps are recomputed in O(1) per change with no database access. Candidate
+courses come from the SQL picker (`catalog.course_picker_page` with
+`exclude_codes=sim.codes`). `save_simulation` persists the accepted plan as
+a new PlanVersion.
+
+Usage:
+    sim = PlanSimulation.load(student_id)
+    sim.add(course_info(course))
+    sim.gaps()
+    save_simulation(sim, user="admin")
+"""
+
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func, select
+from .db import get_session
+from .helpers import enable_audit
+from .metrics import ELECTIVE_TYPE, current_plan_ids_subquery
+from .models import PlanVersion, StudentPlanItem
+from .progress import orientation_label
+from .snapshot import CourseInfo, load_student_snapshot
+
+
+# 5/8 rule: REQUIRED_PER_ORIENTATION electives in one orientation, PLAN_TARGET planned items
+REQUIRED_PER_ORIENTATION = 5
+PLAN_TARGET = 8
+
+
+@dataclass(frozen=True)
+class SimulatedItem:
+    course: CourseInfo
+    estado_plan: str = "planned"
+    prioridad: Optional[int] = None
+    nota: Optional[str] = None
+
+
+class PlanSimulation:
+    """Mutable what-if copy of a student's plan with incrementally kept 5/8 counters."""
+
+    def __init__(
+        self,
+        student_id: int,
+        base_plan_id: Optional[int],
+        completed: dict,
+        items=(),
+        base_items: tuple = (),
+    ):
+        self.student_id = student_id
+        self.base_plan_id = base_plan_id  # plan the simulation started from (None: no current plan)
+        self.base_items = base_items  # `_plan_items_state` of that plan when loaded
+        self.completed = dict(completed)  # {orientation: completed electives}, fixed
+        self.planned = {}  # {orientation: planned electives in the simulated plan}
+        self.planned_total = 0  # planned items of any type (PLAN_TARGET)
+        self.items = {}  # {Course.id: SimulatedItem}, in insertion order
+        self._codes = set()  # course_id codes in the plan (a code can only be added once)
+        for item in items:
+            self._put(item)
+        self.changes = 0
+
+    @classmethod
+    def load(cls, student_id: int) -> "PlanSimulation":
+        """Start a simulation from the student's current plan (or an empty plan)."""
+        snapshot = load_student_snapshot(student_id)
+        if snapshot is None:
+            raise ValueError(f"Student {student_id} does not exist")
+        plan = snapshot.current_plan
+        items = [
+            SimulatedItem(course=item.course, estado_plan=item.estado_plan, prioridad=item.prioridad, nota=item.nota)
+            for item in (plan.items if plan else ())
+            if item.course is not None
+        ]
+        return cls(
+            student_id,
+            plan.id if plan else None,
+            snapshot.elective_counts(),
+            items,
+            base_items=_plan_items_state(plan.items if plan else ()),
+        )
+
+    # --- incremental bookkeeping ------------------------------------------
+
+    def _count(self, item: SimulatedItem, delta: int) -> None:
+        if item.estado_plan != "planned":
+            return
+        self.planned_total += delta
+        if item.course.tipo_materia == ELECTIVE_TYPE:
+            key = orientation_label(item.course.orientacion)
+            self.planned[key] = self.planned.get(key, 0) + delta
+
+    def _put(self, item: SimulatedItem) -> None:
+        self.items[item.course.id] = item
+        self._codes.add(item.course.course_id)
+        self._count(item, +1)
+
+    def _pop(self, course_ref: int) -> SimulatedItem:
+        item = self.items.pop(course_ref)
+        self._codes.discard(item.course.course_id)
+        self._count(item, -1)
+        return item
+
+    # --- changes -------------------------------------------------------------
+
+    @property
+    def codes(self) -> frozenset:
+        """course_id codes already in the simulated plan (excluded from the picker)."""
+        return frozenset(self._codes)
+
+    def can_add(self, course: CourseInfo) -> bool:
+        return course.course_id not in self._codes
+
+    def add(self, course: CourseInfo, estado_plan: str = "planned", prioridad: int = None, nota: str = None) -> None:
+        """Add a catalog course to the simulated plan."""
+        if not self.can_add(course):
+            raise ValueError(f"Course {course.course_id} is already in the plan")
+        self._put(SimulatedItem(course, estado_plan, prioridad, nota))
+        self.changes += 1
+
+    def remove(self, course_ref: int) -> None:
+        """Remove an item from the simulated plan."""
+        self._pop(course_ref)
+        self.changes += 1
+
+    def swap(self, old_ref: int, course: CourseInfo) -> None:
+        """Replace an item by another course, keeping its estado, prioridad and nota."""
+        old = self._pop(old_ref)
+        if not self.can_add(course):
+            self._put(old)
+            raise ValueError(f"Course {course.course_id} is already in the plan")
+        self._put(replace(old, course=course))
+        self.changes += 1
+
+    def set_estado(self, course_ref: int, estado_plan: str) -> None:
+        """Switch an item between planned and backup."""
+        self._put(replace(self._pop(course_ref), estado_plan=estado_plan))
+        self.changes += 1
+
+    # --- evaluation ------------------------------------------------------------
+
+    def count(self, orientation: str) -> int:
+        """Completed plus planned electives in one orientation."""
+        return self.completed.get(orientation, 0) + self.planned.get(orientation, 0)
+
+    def gap(self, orientation: str) -> int:
+        """Electives still missing in one orientation to satisfy the 5/8 rule."""
+        return max(REQUIRED_PER_ORIENTATION - self.count(orientation), 0)
+
+    def gaps(self) -> dict:
+        """Per-orientation completed, planned and gap, for every orientation with electives.
+
+        Returns dict: {orientation: {"completed": int, "planned": int, "gap": int}}
+        ("sin_orientacion" first, then by name)
+        """
+        orientations = sorted(
+            {o for o, n in self.completed.items() if n} | {o for o, n in self.planned.items() if n},
+            key=lambda o: (o != "sin_orientacion", o),
+        )
+        return {
+            o: {"completed": self.completed.get(o, 0), "planned": self.planned.get(o, 0), "gap": self.gap(o)}
+            for o in orientations
+        }
+
+    def best(self) -> tuple:
+        """Orientation closest to the 5/8 rule.
+
+        Returns (orientation, count), or (None, 0) without electives
+        """
+        counts = {o: g["completed"] + g["planned"] for o, g in self.gaps().items()}
+        if not counts:
+            return (None, 0)
+        return max(counts.items(), key=lambda x: x[1])
+
+
+def _plan_items_state(items) -> tuple:
+    """Comparable state of a plan's items (StudentPlanItem rows or PlanItemInfo)."""
+    return tuple(sorted(
+        (item.id, item.course_id_ref, item.estado_plan, item.prioridad, item.nota) for item in items
+    ))
+
+
+def save_simulation(sim: PlanSimulation, user: str = None, comentario: str = None) -> int:
+    """Persist the simulated plan as a new PlanVersion.
+
+    In one audited transaction, checks that the student's current plan is
+    still the one the simulation started from, with the same items, then
+    closes it (if any) and creates the next version with the simulated items.
+
+    Raises ValueError if the plan changed since the simulation was loaded
+    (nothing is written). Returns the new version_num.
+    """
+    with get_session() as session:
+        now = datetime.now()
+        current = current_plan_ids_subquery(now, [sim.student_id])
+        current_id = session.execute(select(current.c.id)).scalar_one_or_none()
+        current_items = session.scalars(
+            select(StudentPlanItem).where(StudentPlanItem.plan_version_id == current_id)
+        ).all() if current_id is not None else ()
+        if current_id != sim.base_plan_id or _plan_items_state(current_items) != sim.base_items:
+            raise ValueError(f"The current plan of student {sim.student_id} changed since the simulation was loaded")
+
+        enable_audit(session, user=user, motivo="Plan aceptado desde simulación")
+        if current_id is not None:
+            session.get(PlanVersion, current_id).vigente_hasta = now
+
+        last_version = session.execute(
+            select(func.max(PlanVersion.version_num)).where(PlanVersion.student_id == sim.student_id)
+        ).scalar()
+        version_num = (last_version or 0) + 1
+        plan = PlanVersion(
+            student_id=sim.student_id,
+            version_num=version_num,
+            vigente_desde=now,
+            vigente_hasta=None,
+            comentario=comentario or f"Plan v{version_num} (simulación)",
+        )
+        session.add(plan)
+        session.flush()
+        session.add_all(
+            StudentPlanItem(
+                plan_version_id=plan.id,
+                course_id_ref=item.course.id,
+                course_id=item.course.course_id,
+                prioridad=item.prioridad,
+                estado_plan=item.estado_plan,
+                nota=item.nota,
+            )
+            for item in sim.items.values()
+        )
+        session.commit()
+    return version_num
@@ -0,0 +1,266 @@
+"""Read-only per-student snapshots used by the Inscripciones and Rutas pages.
+
+`load_student_snapshot` fetches the student, the current plan with its items
+and all enrollments, each with its course, in a single eager-loaded query and
+returns frozen dataclasses, so every page section renders from the same data
+without opening further sessions. `load_plan_history` does the same for all
+plan versions of a student.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from .db import get_session
+from .models import Course, Enrollment, PlanVersion, Student, StudentPlanItem
+from .metrics import ELECTIVE_TYPE, current_plan_ids_subquery
+
+
+@dataclass(frozen=True)
+class CourseInfo:
+    id: int
+    course_id: str
+    programa: Optional[str]
+    anio: Optional[int]
+    materia: Optional[str]
+    inicio: Optional[date]
+    final: Optional[date]
+    tipo_materia: Optional[str]
+    orientacion: Optional[str]
+
+
+@dataclass(frozen=True)
+class EnrollmentInfo:
+    id: int
+    course_id_ref: int
+    course_id: Optional[str]
+    status: str
+    nota: Optional[str]
+    nota_numerica: Optional[float]
+    fecha_registro: Optional[datetime]
+    fecha_estado: Optional[datetime]
+    course: Optional[CourseInfo]
+
+
+@dataclass(frozen=True)
+class PlanItemInfo:
+    id: int
+    course_id_ref: int
+    course_id: Optional[str]
+    prioridad: Optional[int]
+    estado_plan: str
+    nota: Optional[str]
+    course: Optional[CourseInfo]
+
+
+@dataclass(frozen=True)
+class PlanInfo:
+    id: int
+    version_num: int
+    vigente_desde: datetime
+    vigente_hasta: Optional[datetime]
+    comentario: Optional[str]
+    items: tuple
+
+
+@dataclass(frozen=True)
+class StudentSnapshot:
+    student_id: int
+    numero_estudiante: str
+    nombre: str
+    apellido: str
+    email: str
+    programa: Optional[str]
+    cohorte: Optional[str]
+    current_plan: Optional[PlanInfo]
+    enrollments: tuple
+
+    def elective_counts(self, include_planned: bool = False, elective_type: str = ELECTIVE_TYPE) -> dict:
+        """Count electives per orientation: completed enrollments, plus the
+        current plan's planned items when `include_planned` is set.
+
+        Same semantics and key order as `metrics.elective_counts_by_student`
+        (and `progress.get_student_progress` for planned items).
+
+        Returns dict: {orientation: count}
+        """
+        orientations = [
+            e.course.orientacion for e in self.enrollments
+            if e.status == "completed" and e.course and e.course.tipo_materia == elective_type
+        ]
+        if include_planned and self.current_plan:
+            orientations += [
+                item.course.orientacion for item in self.current_plan.items
+                if item.estado_plan == "planned" and item.course and item.course.tipo_materia == elective_type
+            ]
+        counts = {}
+        for orient in orientations:
+            key = orient or "sin_orientacion"
+            counts[key] = counts.get(key, 0) + 1
+        # "sin_orientacion" first, then by name
+        return dict(sorted(counts.items(), key=lambda x: (x[0] != "sin_orientacion", x[0])))
+
+    def rule_5_of_8(self, required_count: int = 5) -> tuple:
+        """Same result as `metrics.check_rule_5_of_8`, computed from the snapshot.
+
+        Returns (ok: bool, best_orientation: str, best_count: int)
+        """
+        counts = self.elective_counts()
+        if not counts:
+            return (False, None, 0)
+        best_orient, best_count = max(counts.items(), key=lambda x: x[1])
+        return (best_count >= required_count, best_orient, best_count)
+
+
+@dataclass(frozen=True)
+class PlanHistoryEntry:
+    plan: PlanInfo
+    counts: dict  # {estado_plan: item count}
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+def course_info(course) -> Optional[CourseInfo]:
+    """Detached CourseInfo copy of a Course (None stays None)."""
+    if course is None:
+        return None
+    return CourseInfo(
+        id=course.id,
+        course_id=course.course_id,
+        programa=course.programa,
+        anio=course.anio,
+        materia=course.materia,
+        inicio=course.inicio,
+        final=course.final,
+        tipo_materia=course.tipo_materia,
+        orientacion=course.orientacion,
+    )
+
+
+def _plan_item_info(item, course) -> PlanItemInfo:
+    return PlanItemInfo(
+        id=item.id,
+        course_id_ref=item.course_id_ref,
+        course_id=item.course_id,
+        prioridad=item.prioridad,
+        estado_plan=item.estado_plan,
+        nota=item.nota,
+        course=course_info(course),
+    )
+
+
+def load_student_snapshot(student_id: int, now: datetime = None) -> Optional[StudentSnapshot]:
+    """Load a student's dashboard data in one round trip.
+
+    Only the current plan version is joined, as in
+    `metrics.get_current_plan` (the student_current_plans pointer, checked
+    against the vigencia dates at `now`, default the current time).
+
+    Returns StudentSnapshot, or None if the student does not exist.
+    """
+    current = current_plan_ids_subquery(now, [student_id])
+    vigente = PlanVersion.id.in_(select(current.c.id))
+    with get_session() as session:
+        student = (
+            session.query(Student)
+            .options(
+                joinedload(Student.enrollments).joinedload(Enrollment.course),
+                joinedload(Student.plan_versions.and_(vigente))
+                .joinedload(PlanVersion.items)
+                .joinedload(StudentPlanItem.course),
+            )
+            .filter(Student.student_id == student_id)
+            .one_or_none()
+        )
+        if student is None:
+            return None
+
+        current_plan = None
+        if student.plan_versions:
+            plan = max(student.plan_versions, key=lambda p: p.vigente_desde)
+            current_plan = PlanInfo(
+                id=plan.id,
+                version_num=plan.version_num,
+                vigente_desde=plan.vigente_desde,
+                vigente_hasta=plan.vigente_hasta,
+                comentario=plan.comentario,
+                items=tuple(_plan_item_info(item, item.course) for item in sorted(plan.items, key=lambda i: i.id)),
+            )
+
+        return StudentSnapshot(
+            student_id=student.student_id,
+            numero_estudiante=student.numero_estudiante,
+            nombre=student.nombre,
+            apellido=student.apellido,
+            email=student.email,
+            programa=student.programa,
+            cohorte=student.cohorte,
+            current_plan=current_plan,
+            enrollments=tuple(
+                EnrollmentInfo(
+                    id=e.id,
+                    course_id_ref=e.course_id_ref,
+                    course_id=e.course_id,
+                    status=e.status,
+                    nota=e.nota,
+                    nota_numerica=e.nota_numerica,
+                    fecha_registro=e.fecha_registro,
+                    fecha_estado=e.fecha_estado,
+                    course=course_info(e.course),
+                )
+                for e in sorted(student.enrollments, key=lambda e: e.id)
+            ),
+        )
+
+
+def load_plan_history(student_id: int) -> tuple:
+    """Load every plan version of a student with its items and their courses.
+
+    Two queries: the versions with their item counts by estado_plan, and the
+    items of all versions joined with their course.
+
+    Returns tuple of PlanHistoryEntry ordered by version_num (items by id)
+    """
+    with get_session() as session:
+        rows = session.execute(
+            select(PlanVersion, StudentPlanItem.estado_plan, func.count(StudentPlanItem.id))
+            .outerjoin(StudentPlanItem, StudentPlanItem.plan_version_id == PlanVersion.id)
+            .where(PlanVersion.student_id == student_id)
+            .group_by(PlanVersion.id, StudentPlanItem.estado_plan)
+            .order_by(PlanVersion.version_num)
+        ).all()
+        item_rows = session.execute(
+            select(StudentPlanItem, Course)
+            .join(PlanVersion, StudentPlanItem.plan_version_id == PlanVersion.id)
+            .outerjoin(Course, Course.id == StudentPlanItem.course_id_ref)
+            .where(PlanVersion.student_id == student_id)
+            .order_by(StudentPlanItem.id)
+        ).all()
+
+        plans, counts = {}, {}
+        for plan, estado, n in rows:
+            plans[plan.id] = plan
+            counts.setdefault(plan.id, {})
+            if estado is not None:
+                counts[plan.id][estado] = n
+        items = {plan_id: [] for plan_id in plans}
+        for item, course in item_rows:
+            items[item.plan_version_id].append(_plan_item_info(item, course))
+
+        return tuple(
+            PlanHistoryEntry(
+                plan=PlanInfo(
+                    id=plan.id,
+                    version_num=plan.version_num,
+                    vigente_desde=plan.vigente_desde,
+                    vigente_hasta=plan.vigente_hasta,
+                    comentario=plan.comentario,
+                    items=tuple(items[plan.id]),
+                ),
+                counts=counts[plan.id],
+            )
+            for plan in plans.values()
+        )
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pandera as pa
 from pandera import Column, DataFrameSchema, Check
@@ -26,6 +27,10 @@ EXPECTED_COLUMNS = [
 ]
 
 
+# Columns validated as pa.String by the schema below
+STRING_COLUMNS = [c for c in EXPECTED_COLUMNS if c not in ("Año", "Horas", "Inicio", "Final")]
+
+
 def _coerce_dates(df: pd.DataFrame, col: str, errors: list):
     try:
         df[col] = pd.to_datetime(df[col], errors="coerce")
@@ -33,37 +38,49 @@ def _coerce_dates(df: pd.DataFrame, col: str, errors: list):
         errors.append(f"Error convirtiendo columna {col} a datetime: {e}")
 
 
-def _safe_float(value):
-    """Safely convert value to float, returning None if conversion fails."""
-    if value is None or pd.isna(value):
-        return None
+def _clean_numeric(df: pd.DataFrame, errors: list):
+    """Coerce Horas/Año column-wise; unparseable values become missing.
+
+    Uses nullable dtypes so missing values do not force ints to float.
+    """
     try:
-        result = float(value)
-        # Ensure it's not NaN
-        if pd.isna(result):
-            return None
-        return result
-    except (ValueError, TypeError):
-        return None
-
-
-def _safe_int(value):
-    """Safely convert value to int, returning None if conversion fails."""
-    if value is None or pd.isna(value):
-        return None
+        df["Horas"] = pd.to_numeric(df["Horas"], errors="coerce").astype("Float64")
+    except Exception as e:
+        errors.append(f"Error en conversión de 'Horas': {e}")
+
     try:
-        float_val = float(value)
-        # Ensure float is not NaN
-        if pd.isna(float_val):
-            return None
-        return int(float_val)
-    except (ValueError, TypeError):
-        return None
+        # Truncate like int(float(value)) did
+        anio = pd.to_numeric(df["Año"], errors="coerce")
+        df["Año"] = pd.Series(np.trunc(anio), index=df.index).astype("Int64")
+    except Exception as e:
+        errors.append(f"Error en conversión de 'Año': {e}")
+
+
+def _clean_strings(df: pd.DataFrame, errors: list):
+    """Give text columns the nullable string dtype.
+
+    Non-empty cells that are not text (e.g. a number in MateriaID) are
+    reported first, as pa.String would; the cast would otherwise turn them
+    into strings silently. Empty columns come out of read_excel as all-NaN
+    float64, which the pa.String checks would reject; a typed column also
+    lets pandera check the dtype instead of every cell.
+    """
+    for col in STRING_COLUMNS:
+        values = df[col]
+        if pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+            continue
+        bad = values[values.notna() & ~values.map(lambda v: isinstance(v, str))]
+        for index, value in bad.items():
+            errors.append(f"Fila {index}: {col} -> {value}")
+    df[STRING_COLUMNS] = df[STRING_COLUMNS].astype("string")
 
 
 def validate_cronograma_df(df: pd.DataFrame):
     """Validate and coerce the cronograma DataFrame.
 
+    Cleaning is done column-wise with `pd.to_numeric(errors="coerce")`,
+    nullable dtypes and a single final conversion of missing values to None.
+
     Returns (cleaned_df, errors_list).
     """
     errors = []
@@ -77,30 +94,10 @@ def validate_cronograma_df(df: pd.DataFrame):
     # Work on a copy
     df = df.copy()
 
-    # AGGRESSIVE NaN CLEANING - Convert all NaN to None first
-    # This prevents pandera validation errors and SQLAlchemy conversion errors
-    df = df.where(pd.notna(df), None)
-
-    # Coerce numeric - but handle None and unparseable values properly
-    try:
-        # For Horas: safely convert to float, keeping None and unparseable values as None
-        df["Horas"] = df["Horas"].apply(_safe_float)
-    except Exception as e:
-        errors.append(f"Error en conversión de 'Horas': {e}")
-
-    # For Año: safely convert to int, keeping None and unparseable values as None
-    try:
-        df["Año"] = df["Año"].apply(_safe_int)
-    except Exception as e:
-        errors.append(f"Error en conversión de 'Año': {e}")
-
-    # Coerce dates
+    _clean_numeric(df, errors)
     _coerce_dates(df, "Inicio", errors)
     _coerce_dates(df, "Final", errors)
-
-    # AGGRESSIVE cleanup before schema validation
-    # Replace any NaN that may have been created during conversions above
-    df = df.where(pd.notna(df), None)
+    _clean_strings(df, errors)
 
     # Basic schema with pandera
     schema = DataFrameSchema(
@@ -135,14 +132,10 @@ def validate_cronograma_df(df: pd.DataFrame):
         for failure in e.failure_cases.itertuples(index=False):
             errors.append(f"Fila {failure.index}: {failure.column} -> {failure.failure_case}")
 
-    # FINAL AGGRESSIVE CLEANUP - Replace all remaining NaN/NA with None
-    # This is done at the very end, before returning
-    for col in df.columns:
-        # For all columns, replace any NaN-like values with None
-        df[col] = df[col].where(pd.notna(df[col]), None)
-
-        # For object-type columns, explicitly handle edge cases
-        if df[col].dtype == object:
-            df[col] = df[col].apply(lambda x: None if (x is None or (pd.isna(x) if not isinstance(x, str) else False)) else x)
+    # Single final pass: missing values become None. Date columns keep their
+    # datetime64 dtype (missing = NaT); boxing them would dominate the runtime.
+    other = [c for c in df.columns if c not in ("Inicio", "Final")]
+    values = df[other].astype(object)
+    df[other] = values.where(values.notna(), None)
 
     return df, errors
@@ -1,10 +1,11 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
 
-from lib.io_excel import import_schedule_excel
+from lib.io_excel import import_schedule_excel, import_schedule_workbook, STREAM_CHUNK_ROWS
+from lib.catalog import catalog_facets, search_courses
 from lib.db import get_session
-from lib.models import Course, CourseSource, ChangeLog
+from lib.helpers import log_change
+from lib.models import CourseSource
 
 
 def run():
@@ -22,11 +23,32 @@ def run():
         with col1:
             import_btn = st.button("Importar", key="import_btn", type="primary")
         with col2:
-            st.write("")
+            import_mode = st.radio(
+                "Origen",
+                ["Hoja consolidada", "Todas las solapas fuente"],
+                horizontal=True,
+                key="import_mode",
+                help="'Todas las solapas fuente' procesa en paralelo cada hoja salvo 'CronogramaConsolidado'",
+            )
 
         if import_btn:
             with st.spinner("Importando..."):
-                summary = import_schedule_excel(uploaded_file)
+                progress_bar = st.progress(0.0, text="Leyendo cronograma...")
+
+                def report_progress(rows_done, total_rows):
+                    if total_rows:
+                        progress_bar.progress(min(rows_done / total_rows, 1.0), text=f"{rows_done}/{total_rows} filas procesadas")
+                    else:
+                        progress_bar.progress(0.0, text=f"{rows_done} filas procesadas")
+
+                def report_sheets(sheets_done, total_sheets):
+                    progress_bar.progress(sheets_done / total_sheets, text=f"{sheets_done}/{total_sheets} solapas procesadas")
+
+                if import_mode == "Todas las solapas fuente":
+                    summary = import_schedule_workbook(uploaded_file, progress=report_sheets)
+                else:
+                    summary = import_schedule_excel(uploaded_file, chunk_size=STREAM_CHUNK_ROWS, progress=report_progress)
+                progress_bar.empty()
 
             # Display summary
             st.subheader("📊 Resumen del Importación")
@@ -40,6 +62,16 @@ def run():
             with col4:
                 st.metric("Fuentes Actualizadas", summary["updated_sources"])
 
+            col5, col6 = st.columns(2)
+            with col5:
+                st.metric("Filas sin Cambios", summary["unchanged_rows"])
+            with col6:
+                st.metric("Filas Ausentes del Archivo", len(summary["deleted_rows"]))
+
+            if summary["deleted_rows"]:
+                with st.expander("Ver filas que ya no están en el archivo"):
+                    st.dataframe(pd.DataFrame(summary["deleted_rows"]), use_container_width=True)
+
             # Display errors if any
             if summary["errors"]:
                 st.error("⚠️ Errores encontrados:")
@@ -50,19 +82,17 @@ def run():
 
             # Register in ChangeLog
             try:
-                with get_session() as session:
-                    log_entry = ChangeLog(
-                        ts=datetime.utcnow(),
-                        user="admin",
-                        entidad="ScheduleImport",
-                        entidad_id=None,
-                        campo="import",
-                        valor_anterior=None,
-                        valor_nuevo=f"{summary['created_courses']} created, {summary['updated_courses']} updated",
-                        motivo="Importación de cronograma desde Excel",
-                    )
-                    session.add(log_entry)
-                    session.commit()
+                log_change(
+                    "ScheduleImport",
+                    None,
+                    campo="import",
+                    valor_nuevo=(
+                        f"{summary['created_courses']} created, {summary['updated_courses']} updated, "
+                        f"{summary['unchanged_rows']} unchanged, {len(summary['deleted_rows'])} not in file"
+                    ),
+                    motivo="Importación de cronograma desde Excel",
+                    user="admin",
+                )
             except Exception as e:
                 st.warning(f"No se pudo registrar en ChangeLog: {e}")
 
@@ -78,71 +108,38 @@ def run():
         st.write("**Filtros y búsqueda**")
         cols = st.columns(5)
 
-        with get_session() as session:
-            # Fetch unique values for filters
-            programas = (
-                session.query(Course.programa)
-                .distinct()
-                .filter(Course.programa != None)
-                .order_by(Course.programa)
-                .all()
-            )
-            programas = [p[0] for p in programas]
-
-            anos = (
-                session.query(Course.anio)
-                .distinct()
-                .filter(Course.anio != None)
-                .order_by(Course.anio)
-                .all()
-            )
-            anos = [a[0] for a in anos]
-
-            tipo_materias = (
-                session.query(Course.tipo_materia)
-                .distinct()
-                .filter(Course.tipo_materia != None)
-                .order_by(Course.tipo_materia)
-                .all()
-            )
-            tipo_materias = [t[0] for t in tipo_materias]
-
-            orientaciones = (
-                session.query(Course.orientacion)
-                .distinct()
-                .filter(Course.orientacion != None)
-                .order_by(Course.orientacion)
-                .all()
-            )
-            orientaciones = [o[0] for o in orientaciones]
+        # Facet values and counts for filters (cached until the catalog changes)
+        facets = catalog_facets()
+        programas = list(facets["programa"])
+        anos = list(facets["anio"])
+        tipo_materias = list(facets["tipo_materia"])
+        orientaciones = list(facets["orientacion"])
+
+        def with_count(facet):
+            return lambda v: f"{v} ({facets[facet][v]})" if v != "" else v
 
         with cols[0]:
-            selected_programa = st.selectbox("Programa", [""] + programas, key="prog_filter")
+            selected_programa = st.selectbox("Programa", [""] + programas, format_func=with_count("programa"), key="prog_filter")
         with cols[1]:
-            selected_ano = st.selectbox("Año", [""] + anos, key="ano_filter")
+            selected_ano = st.selectbox("Año", [""] + anos, format_func=with_count("anio"), key="ano_filter")
         with cols[2]:
-            selected_tipo = st.selectbox("Tipo Materia", [""] + tipo_materias, key="tipo_filter")
+            selected_tipo = st.selectbox("Tipo Materia", [""] + tipo_materias, format_func=with_count("tipo_materia"), key="tipo_filter")
         with cols[3]:
-            selected_orient = st.selectbox("Orientación", [""] + orientaciones, key="orient_filter")
+            selected_orient = st.selectbox("Orientación", [""] + orientaciones, format_func=with_count("orientacion"), key="orient_filter")
         with cols[4]:
             search_materia = st.text_input("Buscar Materia", key="materia_search")
 
-        # Fetch courses with filters
-        with get_session() as session:
-            query = session.query(Course)
-
-            if selected_programa:
-                query = query.filter(Course.programa == selected_programa)
-            if selected_ano:
-                query = query.filter(Course.anio == selected_ano)
-            if selected_tipo:
-                query = query.filter(Course.tipo_materia == selected_tipo)
-            if selected_orient:
-                query = query.filter(Course.orientacion == selected_orient)
-            if search_materia:
-                query = query.filter(Course.materia.ilike(f"%{search_materia}%"))
-
-            courses = query.all()
+        # Fetch courses with filters (full-text search when there is a search text)
+        courses = search_courses(
+            search_materia,
+            filters={
+                "programa": selected_programa,
+                "anio": selected_ano,
+                "tipo_materia": selected_tipo,
+                "orientacion": selected_orient,
+            },
+            limit=None,
+        )
 
         if courses:
             # Convert to DataFrame for display and export
@@ -3,7 +3,8 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 
-from lib import get_session, init_db, log_change
+from lib import audit_batch, enable_audit, get_session, init_db
+from lib.cache import bump_tables, list_students
 from lib.models import Student, Meeting, ChangeLog
 
 
@@ -22,8 +23,7 @@ def run():
     with tab_crud:
         st.subheader("CRUD de Estudiantes")
 
-        with get_session() as session:
-            all_students = session.query(Student).all()
+        all_students = list_students()
 
         if all_students:
             # Selection
@@ -51,35 +51,25 @@ def run():
 
             if st.button("Actualizar Estudiante"):
                 with get_session() as session:
-                    s = session.get(Student, selected_student.student_id)
-                    if s:
-                        if s.numero_estudiante != nuevo_numero_estudiante:
-                            log_change("Student", str(s.student_id), "numero_estudiante", s.numero_estudiante, nuevo_numero_estudiante, user=user_name)
+                    # Changed fields are logged in ChangeLog within the same commit
+                    # All edited fields and their ChangeLog rows in one write
+                    with audit_batch(session, user=user_name):
+                        s = session.get(Student, selected_student.student_id)
+                        if s:
                             s.numero_estudiante = nuevo_numero_estudiante
-                        if s.nombre != nuevo_nombre:
-                            log_change("Student", str(s.student_id), "nombre", s.nombre, nuevo_nombre, user=user_name)
                             s.nombre = nuevo_nombre
-                        if s.apellido != nuevo_apellido:
-                            log_change("Student", str(s.student_id), "apellido", s.apellido, nuevo_apellido, user=user_name)
                             s.apellido = nuevo_apellido
-                        if s.email != nuevo_email:
-                            log_change("Student", str(s.student_id), "email", s.email, nuevo_email, user=user_name)
                             s.email = nuevo_email
-                        if s.programa != nuevo_programa:
-                            log_change("Student", str(s.student_id), "programa", s.programa, nuevo_programa, user=user_name)
                             s.programa = nuevo_programa
-                        if s.cohorte != nuevo_cohorte:
-                            log_change("Student", str(s.student_id), "cohorte", s.cohorte, nuevo_cohorte, user=user_name)
                             s.cohorte = nuevo_cohorte
-                        session.commit()
                 st.success("Estudiante actualizado!")
                 st.rerun()
 
             if st.button("Eliminar Estudiante (soft delete)", key="btn_del"):
                 with get_session() as session:
+                    enable_audit(session, user=user_name, motivo="Soft delete")
                     s = session.get(Student, selected_student.student_id)
                     if s:
-                        log_change("Student", str(s.student_id), "status", "activo", "eliminado", "Soft delete", user=user_name)
                         # In a real system, you'd set a 'deleted_at' or 'is_active' flag
                         session.delete(s)
                         session.commit()
@@ -111,6 +101,7 @@ def run():
                 st.error("Número de estudiante, nombre y email son requeridos.")
             else:
                 with get_session() as session:
+                    enable_audit(session, user=user_name)
                     try:
                         new_student = Student(
                             numero_estudiante=new_numero_estudiante,
@@ -121,9 +112,7 @@ def run():
                             cohorte=new_cohorte,
                         )
                         session.add(new_student)
-                        session.flush()
                         session.commit()
-                        log_change("Student", str(new_student.student_id), "creacion", None, "nuevo estudiante", user=user_name)
                         st.success("Estudiante creado!")
                         st.rerun()
                     except Exception as e:
@@ -191,6 +180,7 @@ def run():
                                     error_list.append(f"Fila {idx}: {e}")
 
                             session.commit()
+                        bump_tables("students")
 
                         st.success(f"✅ {created_count} estudiantes importados.")
                         if error_list:
@@ -205,8 +195,7 @@ def run():
     with tab_meetings:
         st.subheader("Gestión de Reuniones")
 
-        with get_session() as session:
-            all_students = session.query(Student).all()
+        all_students = list_students()
 
         if not all_students:
             st.info("No hay estudiantes registrados.")
@@ -234,6 +223,7 @@ def run():
                     with col2:
                         if st.button("Eliminar", key=f"del_meeting_{m.id}"):
                             with get_session() as sess:
+                                enable_audit(sess, user=user_name)
                                 sess.delete(sess.get(Meeting, m.id))
                                 sess.commit()
                             st.rerun()
@@ -253,6 +243,7 @@ def run():
             if st.button("Guardar Reunión"):
                 if meeting_date:
                     with get_session() as session:
+                        enable_audit(session, user=user_name)
                         meeting = Meeting(
                             student_id=selected_student.student_id,
                             fecha=meeting_date,
@@ -262,7 +253,6 @@ def run():
                         )
                         session.add(meeting)
                         session.commit()
-                    log_change("Meeting", str(meeting.id), "creacion", None, f"Reunión {meeting_date}", user=user_name)
                     st.success("Reunión guardada!")
                     st.rerun()
                 else:
@@ -2,9 +2,18 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 
-from lib import get_session, init_db, log_change
-from lib.models import Student, PlanVersion, StudentPlanItem, Course, Enrollment
-from lib.metrics import elective_counts_by_orientation, get_current_plan
+from lib import enable_audit, get_session, init_db
+from lib.cache import list_students
+from lib.catalog import catalog_facets, course_picker_page
+from lib.models import PlanVersion, StudentPlanItem
+from lib.metrics import get_current_plan
+from lib.progress import get_student_progress
+from lib.simulator import PLAN_TARGET, REQUIRED_PER_ORIENTATION, PlanSimulation, save_simulation
+from lib.snapshot import course_info, load_plan_history
+
+
+# Candidate courses listed at once in the simulator's selectbox
+SIM_MAX_OPTIONS = 100
 
 
 def run():
@@ -14,8 +23,7 @@ def run():
 
     user_name = st.sidebar.text_input("Usuario (para ChangeLog)", value="admin")
 
-    with get_session() as session:
-        all_students = session.query(Student).all()
+    all_students = list_students()
 
     if not all_students:
         st.info("No hay estudiantes registrados.")
@@ -27,23 +35,23 @@ def run():
 
     st.write(f"**Email:** {selected_student.email} | **Programa:** {selected_student.programa} | **Cohorte:** {selected_student.cohorte or 'N/A'}")
 
-    # Fetch student's plans
-    with get_session() as session:
-        plans = session.query(PlanVersion).filter_by(student_id=selected_student.student_id).order_by(PlanVersion.version_num).all()
+    # Fetch student's plans: every version with its items and courses (2 queries)
+    history = load_plan_history(selected_student.student_id)
+    plans = [entry.plan for entry in history]
+    history_by_id = {entry.plan.id: entry for entry in history}
+    # Current (vigente) plan, resolved once for every section
+    current_plan = get_current_plan(selected_student.student_id) if plans else None
 
     # ===== SECTION: Current Plan Overview =====
     st.markdown("---")
     st.subheader("📋 Estado Actual del Plan")
 
     if plans:
-        # Find current (vigente) plan
-        current_plan = get_current_plan(selected_student.student_id)
-
         if current_plan:
-            with get_session() as session:
-                items = session.query(StudentPlanItem).filter_by(plan_version_id=current_plan.id).all()
-                planned_count = len([i for i in items if i.estado_plan == "planned"])
-                backup_count = len([i for i in items if i.estado_plan == "backup"])
+            current_entry = history_by_id[current_plan.id]
+            items = current_entry.plan.items
+            planned_count = current_entry.counts.get("planned", 0)
+            backup_count = current_entry.counts.get("backup", 0)
 
             col1, col2, col3, col4 = st.columns(4)
             with col1:
@@ -69,33 +77,22 @@ def run():
             with col_val2:
                 # Check if orientation goal is reachable
                 if items:
-                    with get_session() as session:
-                        planned_items = session.query(StudentPlanItem, Course).join(
-                            Course, StudentPlanItem.course_id_ref == Course.id
-                        ).filter(
-                            StudentPlanItem.plan_version_id == current_plan.id,
-                            StudentPlanItem.estado_plan == "planned",
-                            Course.tipo_materia == "electiva",
-                        ).all()
-
-                        orientation_counts = {}
-                        for item, course in planned_items:
-                            orient = course.orientacion or "sin_orientacion"
-                            orientation_counts[orient] = orientation_counts.get(orient, 0) + 1
-
-                        if orientation_counts:
-                            best_orient = max(orientation_counts.items(), key=lambda x: x[1])
-                            best_count = best_orient[1]
-                            best_name = best_orient[0]
-
-                            if best_count >= 5:
-                                st.success(f"✅ {best_name}: {best_count}/5 electivas planned (meta alcanzable)")
-                            elif best_count >= 3:
-                                st.warning(f"⚠️ {best_name}: {best_count}/5 electivas planned (gap: {5 - best_count})")
-                            else:
-                                st.error(f"❌ {best_name}: {best_count}/5 electivas planned (gap: {5 - best_count} - RIESGO)")
+                    progress = get_student_progress([selected_student.student_id])[selected_student.student_id]
+                    orientation_counts = {o: p["planned"] for o, p in progress.items() if p["planned"]}
+
+                    if orientation_counts:
+                        best_orient = max(orientation_counts.items(), key=lambda x: x[1])
+                        best_count = best_orient[1]
+                        best_name = best_orient[0]
+
+                        if best_count >= 5:
+                            st.success(f"✅ {best_name}: {best_count}/5 electivas planned (meta alcanzable)")
+                        elif best_count >= 3:
+                            st.warning(f"⚠️ {best_name}: {best_count}/5 electivas planned (gap: {5 - best_count})")
                         else:
-                            st.warning("⚠️ Sin electivas planned aún")
+                            st.error(f"❌ {best_name}: {best_count}/5 electivas planned (gap: {5 - best_count} - RIESGO)")
+                    else:
+                        st.warning("⚠️ Sin electivas planned aún")
         else:
             st.info("Sin plan vigente actualmente")
     else:
@@ -106,10 +103,10 @@ def run():
     st.subheader("📚 Historial de Versiones")
 
     if plans:
-        for plan in plans:
-            with get_session() as session:
-                items = session.query(StudentPlanItem).filter_by(plan_version_id=plan.id).all()
-                item_count = len(items)
+        for entry in history:
+            plan = entry.plan
+            items = plan.items
+            item_count = entry.total
 
             col_info, col_action = st.columns([4, 1])
 
@@ -131,21 +128,20 @@ def run():
             if st.session_state.get(f"show_plan_{plan.id}", False):
                 with st.expander("Contenido del plan", expanded=True):
                     if items:
-                        with get_session() as session:
-                            plan_data = []
-                            for item in items:
-                                course = session.get(Course, item.course_id)
-                                plan_data.append({
-                                    "Materia": course.materia if course else "N/A",
-                                    "Tipo": course.tipo_materia if course else "N/A",
-                                    "Orientación": course.orientacion if course else "N/A",
-                                    "Estado": item.estado_plan,
-                                    "Prioridad": item.prioridad,
-                                    "Nota": item.nota or "",
-                                })
-
-                            df_plan = pd.DataFrame(plan_data)
-                            st.dataframe(df_plan, use_container_width=True)
+                        plan_data = []
+                        for item in items:
+                            course = item.course
+                            plan_data.append({
+                                "Materia": course.materia if course else "N/A",
+                                "Tipo": course.tipo_materia if course else "N/A",
+                                "Orientación": course.orientacion if course else "N/A",
+                                "Estado": item.estado_plan,
+                                "Prioridad": item.prioridad,
+                                "Nota": item.nota or "",
+                            })
+
+                        df_plan = pd.DataFrame(plan_data)
+                        st.dataframe(df_plan, use_container_width=True)
 
                         # Remove item buttons
                         st.write("**Eliminar items:**")
@@ -154,11 +150,9 @@ def run():
                             with col_del:
                                 if st.button("X", key=f"del_item_{item.id}"):
                                     with get_session() as sess:
-                                        i = sess.get(StudentPlanItem, item.id)
-                                        course_name = session.get(Course, i.course_id).materia if session.get(Course, i.course_id) else "N/A"
-                                        sess.delete(i)
+                                        enable_audit(sess, user=user_name, motivo="Eliminado del plan")
+                                        sess.delete(sess.get(StudentPlanItem, item.id))
                                         sess.commit()
-                                    log_change("StudentPlanItem", str(item.id), "eliminacion", f"Materia {course_name}", None, motivo="Eliminado del plan", user=user_name)
                                     st.rerun()
 
     # ===== SECTION: Create or Manage Current Version =====
@@ -174,6 +168,7 @@ def run():
 
             if submitted:
                 with get_session() as session:
+                    enable_audit(session, user=user_name, motivo="Nuevo plan del estudiante")
                     plan = PlanVersion(
                         student_id=selected_student.student_id,
                         version_num=1,
@@ -182,16 +177,12 @@ def run():
                         comentario=comentario,
                     )
                     session.add(plan)
-                    session.flush()
                     session.commit()
-                    log_change("PlanVersion", str(plan.id), "creacion", None, "v1", motivo="Nuevo plan del estudiante", user=user_name)
                 st.success("✅ Plan v1 creado!")
                 st.rerun()
 
     else:
         # Manage current plan or create new version
-        current_plan = get_current_plan(selected_student.student_id)
-
         if current_plan:
             st.write(f"Plan vigente: **v{current_plan.version_num}**")
 
@@ -200,96 +191,103 @@ def run():
             with col_edit:
                 st.write("### Agregar Materia a Plan Vigente")
 
-                # Fetch available courses
-                with get_session() as session:
-                    all_courses = session.query(Course).all()
-                    existing_ids = set(
-                        session.query(StudentPlanItem.course_id).filter_by(plan_version_id=current_plan.id).all()
-                    )
-                    existing_ids = {c[0] for c in existing_ids}
-
-                # Filter courses not yet in plan
-                available_courses = [c for c in all_courses if c.course_id not in existing_ids]
+                # Filters
+                facets = catalog_facets()
+                programas = list(facets["programa"])
+                anos = list(facets["anio"])
+                tipo_materias = list(facets["tipo_materia"])
+                orientaciones = list(facets["orientacion"])
+
+                col_f1, col_f2 = st.columns(2)
+                with col_f1:
+                    filt_programa = st.selectbox("Programa", [""] + programas, key="route_prog")
+                    filt_tipo = st.selectbox("Tipo Materia", [""] + tipo_materias, key="route_tipo")
+                with col_f2:
+                    filt_ano = st.selectbox("Año", [""] + [str(a) for a in anos], key="route_ano")
+                    filt_orient = st.selectbox("Orientación", [""] + orientaciones, key="route_orient")
+
+                search_text = st.text_input("Buscar por materia", key="route_search")
+
+                filters = {
+                    "programa": filt_programa,
+                    "tipo_materia": filt_tipo,
+                    "anio": int(filt_ano) if filt_ano else None,
+                    "orientacion": filt_orient,
+                }
+
+                # Back to the first page whenever the plan, filters or search change
+                picker_key = (current_plan.id, tuple(filters.items()), search_text)
+                if st.session_state.get("route_picker_key") != picker_key:
+                    st.session_state["route_picker_key"] = picker_key
+                    st.session_state["route_picker_page"] = 0
+                page = st.session_state["route_picker_page"]
+
+                # Fetch one page of the courses not yet in the plan
+                filtered, has_more = course_picker_page(current_plan.id, search_text, filters, page=page)
+                if not filtered and page > 0:
+                    # The last page emptied (its only course was just added): step back
+                    st.session_state["route_picker_page"] = page - 1
+                    st.rerun()
 
-                if available_courses:
-                    # Filters
-                    with get_session() as session:
-                        programas = sorted(set(c.programa for c in all_courses if c.programa))
-                        anos = sorted(set(c.anio for c in all_courses if c.anio))
-                        tipo_materias = sorted(set(c.tipo_materia for c in all_courses if c.tipo_materia))
-                        orientaciones = sorted(set(c.orientacion for c in all_courses if c.orientacion))
-
-                    col_f1, col_f2 = st.columns(2)
-                    with col_f1:
-                        filt_programa = st.selectbox("Programa", [""] + programas, key="route_prog")
-                        filt_tipo = st.selectbox("Tipo Materia", [""] + tipo_materias, key="route_tipo")
-                    with col_f2:
-                        filt_ano = st.selectbox("Año", [""] + [str(a) for a in anos], key="route_ano")
-                        filt_orient = st.selectbox("Orientación", [""] + orientaciones, key="route_orient")
-
-                    search_text = st.text_input("Buscar por materia", key="route_search")
-
-                    # Filter courses
-                    filtered = available_courses
-                    if filt_programa:
-                        filtered = [c for c in filtered if c.programa == filt_programa]
-                    if filt_tipo:
-                        filtered = [c for c in filtered if c.tipo_materia == filt_tipo]
-                    if filt_ano:
-                        filtered = [c for c in filtered if str(c.anio) == filt_ano]
-                    if filt_orient:
-                        filtered = [c for c in filtered if c.orientacion == filt_orient]
-                    if search_text:
-                        filtered = [c for c in filtered if search_text.lower() in c.materia.lower()]
-
-                    if filtered:
-                        course_labels = [f"{c.materia} ({c.programa}/{c.anio}) - {c.tipo_materia}" for c in filtered]
-                        selected_idx = st.selectbox("Seleccionar materia", range(len(filtered)), format_func=lambda i: course_labels[i], key="route_course_select")
-                        selected_course = filtered[selected_idx]
-
-                        col_p, col_s = st.columns(2)
-                        with col_p:
-                            prioridad = st.number_input("Prioridad", min_value=1, value=1, step=1)
-                        with col_s:
-                            estado = st.selectbox("Estado del Plan", ["planned", "backup"], key="route_state")
-
-                        nota = st.text_area("Nota (opcional)", key="route_nota")
-
-                        if st.button("Agregar a Plan", key="add_to_plan"):
-                            with get_session() as session:
-                                item = StudentPlanItem(
-                                    plan_version_id=current_plan.id,
-                                    course_id_ref=selected_course.id,
-                                    course_id=selected_course.course_id,  # Store for reference
-                                    prioridad=prioridad,
-                                    estado_plan=estado,
-                                    nota=nota if nota else None,
-                                )
-                                session.add(item)
-                                session.commit()
-                            log_change("StudentPlanItem", str(item.id), "creacion", None, f"{selected_course.materia} ({estado})", motivo="Agregado a plan vigente", user=user_name)
-                            st.success(f"✅ {selected_course.materia} agregado ({estado})")
-                            st.rerun()
-                    else:
-                        st.info("No hay materias disponibles con los filtros seleccionados.")
-                else:
+                if filtered:
+                    course_labels = [f"{c.materia} ({c.programa}/{c.anio}) - {c.tipo_materia}" for c in filtered]
+                    selected_idx = st.selectbox("Seleccionar materia", range(len(filtered)), format_func=lambda i: course_labels[i], key="route_course_select")
+                    selected_course = filtered[selected_idx]
+
+                    if page > 0 or has_more:
+                        col_prev, col_pos, col_next = st.columns([1, 2, 1])
+                        with col_prev:
+                            if st.button("◀", disabled=page == 0, key="route_picker_prev"):
+                                st.session_state["route_picker_page"] = page - 1
+                                st.rerun()
+                        with col_pos:
+                            st.caption(f"Página {page + 1}")
+                        with col_next:
+                            if st.button("▶", disabled=not has_more, key="route_picker_next"):
+                                st.session_state["route_picker_page"] = page + 1
+                                st.rerun()
+
+                    col_p, col_s = st.columns(2)
+                    with col_p:
+                        prioridad = st.number_input("Prioridad", min_value=1, value=1, step=1)
+                    with col_s:
+                        estado = st.selectbox("Estado del Plan", ["planned", "backup"], key="route_state")
+
+                    nota = st.text_area("Nota (opcional)", key="route_nota")
+
+                    if st.button("Agregar a Plan", key="add_to_plan"):
+                        with get_session() as session:
+                            enable_audit(session, user=user_name, motivo="Agregado a plan vigente")
+                            item = StudentPlanItem(
+                                plan_version_id=current_plan.id,
+                                course_id_ref=selected_course.id,
+                                course_id=selected_course.course_id,  # Store for reference
+                                prioridad=prioridad,
+                                estado_plan=estado,
+                                nota=nota if nota else None,
+                            )
+                            session.add(item)
+                            session.commit()
+                        st.success(f"✅ {selected_course.materia} agregado ({estado})")
+                        st.rerun()
+                elif page == 0 and not search_text and not any(filters.values()):
                     st.info("Todas las materias disponibles ya están en el plan.")
+                else:
+                    st.info("No hay materias disponibles con los filtros seleccionados.")
 
             with col_close:
                 st.write("### Cerrar Versión")
                 st.write(f"Plan v{current_plan.version_num} - Vigente desde {current_plan.vigente_desde.date()}")
 
                 if st.button("Cerrar esta versión y crear nueva", key="close_version"):
-                    # Close current plan
+                    # Close current plan and create the new version in one transaction
                     with get_session() as session:
+                        enable_audit(session, user=user_name, motivo="Cerrada para crear nueva versión")
                         plan_to_close = session.get(PlanVersion, current_plan.id)
                         plan_to_close.vigente_hasta = datetime.now()
-                        session.commit()
-
-                    log_change("PlanVersion", str(current_plan.id), "cierre", "vigente_hasta", None, datetime.now().date(), motivo="Cerrada para crear nueva versión", user=user_name)
+                        session.flush()
 
-                    # Create new version
-                    with get_session() as session:
+                        enable_audit(session, user=user_name, motivo="Nueva versión tras cerrar anterior")
                         next_version = max([p.version_num for p in plans]) + 1
                         new_plan = PlanVersion(
                             student_id=selected_student.student_id,
@@ -301,14 +299,12 @@ def run():
                         session.add(new_plan)
                         session.commit()
 
-                    log_change("PlanVersion", str(new_plan.id), "creacion", None, f"v{next_version}", motivo="Nueva versión tras cerrar anterior", user=user_name)
                     st.success(f"✅ Versión cerrada. Nuevo plan v{next_version} creado.")
                     st.rerun()
 
         else:
             # No current plan, but there are old plans
-            with get_session() as session:
-                max_version = max([p.version_num for p in plans])
+            max_version = max(p.version_num for p in plans)
 
             st.write(f"No hay plan vigente. Última versión: v{max_version}")
             st.write("Crea una nueva versión:")
@@ -319,6 +315,7 @@ def run():
 
                 if submitted:
                     with get_session() as session:
+                        enable_audit(session, user=user_name, motivo="Nueva versión")
                         new_plan = PlanVersion(
                             student_id=selected_student.student_id,
                             version_num=max_version + 1,
@@ -327,32 +324,133 @@ def run():
                             comentario=comentario,
                         )
                         session.add(new_plan)
-                        session.flush()
                         session.commit()
-                        log_change("PlanVersion", str(new_plan.id), "creacion", None, f"v{max_version + 1}", motivo="Nueva versión", user=user_name)
                     st.success(f"✅ Plan v{max_version + 1} creado!")
                     st.rerun()
 
+    # ===== SECTION: What-if Simulator =====
+    st.markdown("---")
+    st.subheader("🧪 Simulador de Plan")
+
+    # The simulation lives in session_state: changes are evaluated in memory
+    # and only the accepted plan is written, as a new version
+    base_plan_id = current_plan.id if current_plan else None
+    sim = st.session_state.get("route_sim")
+    if sim is not None and (sim.student_id != selected_student.student_id or sim.base_plan_id != base_plan_id):
+        sim = None
+        st.session_state.pop("route_sim", None)
+
+    if sim is None:
+        st.write("Prueba cambios sobre el plan vigente sin guardarlos: agrega, quita o reemplaza materias y observa la regla 5/8 al instante.")
+        if st.button("Iniciar simulación", key="sim_start"):
+            st.session_state["route_sim"] = PlanSimulation.load(selected_student.student_id)
+            st.rerun()
+    else:
+        best_orient, best_count = sim.best()
+        col_m1, col_m2, col_m3 = st.columns(3)
+        with col_m1:
+            st.metric("Items Planned", f"{sim.planned_total}/{PLAN_TARGET}")
+        with col_m2:
+            st.metric("Mejor Orientación", f"{best_orient or '-'}: {best_count}/{REQUIRED_PER_ORIENTATION}")
+        with col_m3:
+            st.metric("Cambios sin guardar", sim.changes)
+
+        gaps = sim.gaps()
+        if gaps:
+            st.dataframe(
+                pd.DataFrame([
+                    {"Orientación": o, "Completadas": g["completed"], "Planificadas": g["planned"], "Faltan": g["gap"]}
+                    for o, g in gaps.items()
+                ]),
+                use_container_width=True,
+            )
+        else:
+            st.warning("⚠️ Sin electivas completadas ni planned en la simulación")
+
+        # Candidate courses not yet in the simulated plan, searched in SQL
+        sim_search = st.text_input("Buscar materia", key="sim_search")
+        candidates, more_candidates = course_picker_page(
+            None, sim_search, page_size=SIM_MAX_OPTIONS, exclude_codes=sim.codes
+        )
+        candidates = [course_info(c) for c in candidates]
+
+        def course_label(c):
+            return f"{c.materia} ({c.programa}/{c.anio}) - {c.tipo_materia} - {c.orientacion or 'sin orientación'}"
+
+        col_add, col_item = st.columns(2)
+
+        with col_add:
+            st.write("**Agregar o reemplazar**")
+            if candidates:
+                candidate_idx = st.selectbox("Materia", range(len(candidates)), format_func=lambda i: course_label(candidates[i]), key="sim_candidate")
+                candidate = candidates[candidate_idx]
+                if more_candidates:
+                    st.caption(f"Mostrando las primeras {SIM_MAX_OPTIONS}; refina la búsqueda.")
+                sim_estado = st.selectbox("Estado del Plan", ["planned", "backup"], key="sim_estado")
+                if st.button("Agregar", key="sim_add"):
+                    sim.add(candidate, sim_estado)
+                    st.rerun()
+            else:
+                candidate = None
+                st.info("No hay materias disponibles con esa búsqueda.")
+
+        with col_item:
+            st.write("**Items simulados**")
+            if sim.items:
+                item_labels = {ref: f"{course_label(item.course)} [{item.estado_plan}]" for ref, item in sim.items.items()}
+                item_ref = st.selectbox("Item", list(item_labels), format_func=item_labels.get, key="sim_item")
+                col_b1, col_b2, col_b3 = st.columns(3)
+                with col_b1:
+                    if st.button("Quitar", key="sim_remove"):
+                        sim.remove(item_ref)
+                        st.rerun()
+                with col_b2:
+                    if st.button("Planned ↔ Backup", key="sim_toggle"):
+                        sim.set_estado(item_ref, "backup" if sim.items[item_ref].estado_plan == "planned" else "planned")
+                        st.rerun()
+                with col_b3:
+                    if st.button("Reemplazar", key="sim_swap", disabled=candidate is None):
+                        sim.swap(item_ref, candidate)
+                        st.rerun()
+            else:
+                st.info("El plan simulado está vacío.")
+
+        sim_comentario = st.text_input("Comentario para la nueva versión", value="Plan aceptado desde simulación", key="sim_comentario")
+        col_save, col_discard = st.columns(2)
+        with col_save:
+            if st.button("💾 Guardar como nueva versión", key="sim_save", disabled=not sim.items):
+                st.session_state.pop("route_sim", None)
+                try:
+                    version_num = save_simulation(sim, user=user_name, comentario=sim_comentario)
+                except ValueError:
+                    st.error("❌ El plan vigente cambió desde que se inició la simulación; no se guardó. Inicia una nueva simulación.")
+                else:
+                    st.success(f"✅ Plan v{version_num} creado desde la simulación.")
+                    st.rerun()
+        with col_discard:
+            if st.button("Descartar simulación", key="sim_discard"):
+                st.session_state.pop("route_sim", None)
+                st.rerun()
+
     # ===== SECTION: Summary Table =====
     st.markdown("---")
     st.subheader("📊 Sumario de Planes del Estudiante")
 
     if plans:
         summary_data = []
-        for plan in plans:
-            with get_session() as session:
-                items = session.query(StudentPlanItem).filter_by(plan_version_id=plan.id).all()
-                planned = len([i for i in items if i.estado_plan == "planned"])
-                backup = len([i for i in items if i.estado_plan == "backup"])
+        for entry in history:
+            plan = entry.plan
+            planned = entry.counts.get("planned", 0)
+            backup = entry.counts.get("backup", 0)
 
-            status = "Vigente" if (not plan.vigente_hasta) else "Cerrada"
+            status = "Vigente" if current_plan and plan.id == current_plan.id else "Cerrada"
             summary_data.append({
                 "Versión": f"v{plan.version_num}",
                 "Desde": plan.vigente_desde.date(),
                 "Hasta": plan.vigente_hasta.date() if plan.vigente_hasta else "Vigente",
                 "Planned": planned,
                 "Backup": backup,
-                "Total": len(items),
+                "Total": entry.total,
                 "Estado": status,
             })
 
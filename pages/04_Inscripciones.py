@@ -2,9 +2,10 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 
-from lib import get_session, init_db, log_change
-from lib.models import Student, PlanVersion, StudentPlanItem, Course, Enrollment
-from lib.metrics import get_current_plan, check_rule_5_of_8
+from lib import audit_batch, enable_audit, get_session, init_db
+from lib.cache import list_courses, list_students
+from lib.models import Enrollment
+from lib.snapshot import load_student_snapshot
 
 
 def run():
@@ -14,8 +15,7 @@ def run():
 
     user_name = st.sidebar.text_input("Usuario (para ChangeLog)", value="admin")
 
-    with get_session() as session:
-        all_students = session.query(Student).all()
+    all_students = list_students()
 
     if not all_students:
         st.info("No hay estudiantes registrados.")
@@ -25,13 +25,18 @@ def run():
     selected_label = st.selectbox("Seleccionar estudiante", list(student_map.keys()), key="enroll_student")
     selected_student = student_map[selected_label]
 
-    st.write(f"**Email:** {selected_student.email} | **Programa:** {selected_student.programa} | **Cohorte:** {selected_student.cohorte or 'N/A'}")
+    # Student, current plan and enrollments (with courses) in one round trip;
+    # every section below renders from this snapshot
+    snapshot = load_student_snapshot(selected_student.student_id)
+    if snapshot is None:
+        st.warning("El estudiante ya no existe.")
+        return
 
-    # Get current plan and enrollments
-    current_plan = get_current_plan(selected_student.student_id)
+    st.write(f"**Email:** {snapshot.email} | **Programa:** {snapshot.programa} | **Cohorte:** {snapshot.cohorte or 'N/A'}")
 
-    with get_session() as session:
-        enrollments = session.query(Enrollment).filter_by(student_id=selected_student.student_id).all()
+    current_plan = snapshot.current_plan
+    plan_items = current_plan.items if current_plan else ()
+    enrollments = snapshot.enrollments
 
     # ===== SECTION: Alerts & Validations =====
     st.markdown("---")
@@ -40,57 +45,30 @@ def run():
     alerts = []
 
     # Alert 1: Duplicated courses
-    with get_session() as session:
-        course_ids = [e.course_id for e in enrollments]
-        duplicated = [c for c in set(course_ids) if course_ids.count(c) > 1]
+    course_ids = [e.course_id for e in enrollments]
+    duplicated = [c for c in set(course_ids) if course_ids.count(c) > 1]
 
     if duplicated:
         for course_id in duplicated:
-            alert_msg = f"Materia {course_id}: inscrito P{enrollments.count(e for e in enrollments if e.course_id == course_id)} veces (DUPLICADO)"
+            alert_msg = f"Materia {course_id}: inscrito {course_ids.count(course_id)} veces (DUPLICADO)"
             alerts.append(alert_msg)
 
     # Alert 2: Completed courses not in plan
+    plan_course_refs = set(item.course_id_ref for item in plan_items)
+    if current_plan:
+        for enroll in enrollments:
+            if enroll.status == "completed" and enroll.course_id_ref not in plan_course_refs:
+                alerts.append(f"Completó {enroll.course_id} que NO está en el plan vigente")
+
+    # Alert 3: Won't reach 5/8 (completed + planned electives)
     if current_plan:
-        with get_session() as session:
-            plan_items = session.query(StudentPlanItem).filter_by(plan_version_id=current_plan.id).all()
-            plan_course_ids = set(item.course_id for item in plan_items)
-
-            completed = session.query(Enrollment).filter(
-                Enrollment.student_id == selected_student.student_id,
-                Enrollment.status == "completed",
-            ).all()
-
-            for enroll in completed:
-                if enroll.course_id not in plan_course_ids:
-                    alerts.append(f"Completó {enroll.course_id} que NO está en el plan vigente")
-
-    # Alert 3: Won't reach 5/8
-    with get_session() as session:
-        completed_enrolls = session.query(Enrollment).filter(
-            Enrollment.student_id == selected_student.student_id,
-            Enrollment.status == "completed",
-        ).all()
-        completed_count = len(completed_enrolls)
-
-        if current_plan:
-            plan_items = session.query(StudentPlanItem).filter_by(plan_version_id=current_plan.id).all()
-            planned_items = [i for i in plan_items if i.estado_plan == "planned"]
-
-            # Count orientations in completed + planned
-            all_items = completed_enrolls + [StudentPlanItem(course_id=p.course_id, estado_plan=p.estado_plan) for p in planned_items]
-            orientation_counts = {}
-
-            for item in all_items:
-                course = session.get(Course, item.course_id if isinstance(item, StudentPlanItem) else item.course_id)
-                if course and course.tipo_materia == "electiva":
-                    orient = course.orientacion or "sin_orientacion"
-                    orientation_counts[orient] = orientation_counts.get(orient, 0) + 1
-
-            if orientation_counts:
-                best_count = max(orientation_counts.values())
-                if best_count < 5:
-                    gap = 5 - best_count
-                    alerts.append(f"⚠️ Máximo en una orientación: {best_count}/5 (gap: {gap} electivas)")
+        orientation_counts = snapshot.elective_counts(include_planned=True)
+
+        if orientation_counts:
+            best_count = max(orientation_counts.values())
+            if best_count < 5:
+                gap = 5 - best_count
+                alerts.append(f"⚠️ Máximo en una orientación: {best_count}/5 (gap: {gap} electivas)")
 
     if alerts:
         for alert in alerts:
@@ -103,62 +81,62 @@ def run():
     st.subheader("📋 Plan Vigente vs Inscripciones Reales")
 
     if current_plan:
-        with get_session() as session:
-            plan_items = session.query(StudentPlanItem).filter_by(plan_version_id=current_plan.id).all()
+        enrollments_by_ref = {}
+        for enroll in enrollments:
+            enrollments_by_ref.setdefault(enroll.course_id_ref, enroll)
+
+        comparison_data = []
 
-            comparison_data = []
+        # Get all courses from plan items
+        for item in plan_items:
+            course = item.course
+            materia_name = course.materia if course else "N/A"
+            tipo = course.tipo_materia if course else "N/A"
+            orientacion = course.orientacion if course else "N/A"
 
-            # Get all courses from plan items
-            for item in plan_items:
-                course = session.get(Course, item.course_id)
+            # Find corresponding enrollment
+            matching_enroll = enrollments_by_ref.get(item.course_id_ref)
+
+            if matching_enroll:
+                enroll_status = matching_enroll.status
+                enroll_nota = matching_enroll.nota_numerica or "-"
+            else:
+                enroll_status = "-"
+                enroll_nota = "-"
+
+            comparison_data.append({
+                "Materia ID": item.course_id,
+                "Materia": materia_name,
+                "Tipo": tipo,
+                "Orientación": orientacion,
+                "Plan Estado": item.estado_plan,
+                "Enrollments Status": enroll_status,
+                "Nota": enroll_nota,
+            })
+
+        # Add enrollments not in plan
+        for enroll in enrollments:
+            if enroll.course_id_ref not in plan_course_refs:
+                course = enroll.course
                 materia_name = course.materia if course else "N/A"
                 tipo = course.tipo_materia if course else "N/A"
                 orientacion = course.orientacion if course else "N/A"
 
-                # Find corresponding enrollment
-                matching_enroll = next((e for e in enrollments if e.course_id == item.course_id), None)
-
-                if matching_enroll:
-                    enroll_status = matching_enroll.status
-                    enroll_nota = matching_enroll.nota_numerica or "-"
-                else:
-                    enroll_status = "-"
-                    enroll_nota = "-"
-
                 comparison_data.append({
-                    "Materia ID": item.course_id,
+                    "Materia ID": enroll.course_id,
                     "Materia": materia_name,
                     "Tipo": tipo,
                     "Orientación": orientacion,
-                    "Plan Estado": item.estado_plan,
-                    "Enrollments Status": enroll_status,
-                    "Nota": enroll_nota,
+                    "Plan Estado": "❌ NO EN PLAN",
+                    "Enrollments Status": enroll.status,
+                    "Nota": enroll.nota_numerica or "-",
                 })
 
-            # Add enrollments not in plan
-            plan_course_ids = set(item.course_id for item in plan_items)
-            for enroll in enrollments:
-                if enroll.course_id not in plan_course_ids:
-                    course = session.get(Course, enroll.course_id)
-                    materia_name = course.materia if course else "N/A"
-                    tipo = course.tipo_materia if course else "N/A"
-                    orientacion = course.orientacion if course else "N/A"
-
-                    comparison_data.append({
-                        "Materia ID": enroll.course_id,
-                        "Materia": materia_name,
-                        "Tipo": tipo,
-                        "Orientación": orientacion,
-                        "Plan Estado": "❌ NO EN PLAN",
-                        "Enrollments Status": enroll.status,
-                        "Nota": enroll.nota_numerica or "-",
-                    })
-
-            if comparison_data:
-                df_comparison = pd.DataFrame(comparison_data)
-                st.dataframe(df_comparison, use_container_width=True)
-            else:
-                st.info("Sin items en el plan vigente")
+        if comparison_data:
+            df_comparison = pd.DataFrame(comparison_data)
+            st.dataframe(df_comparison, use_container_width=True)
+        else:
+            st.info("Sin items en el plan vigente")
     else:
         st.info("Este estudiante no tiene plan vigente")
 
@@ -167,39 +145,34 @@ def run():
     st.subheader("📥 Crear Inscripciones desde Plan Vigente")
 
     if current_plan:
-        with get_session() as session:
-            plan_items = session.query(StudentPlanItem).filter_by(
-                plan_version_id=current_plan.id,
-                estado_plan="planned",
-            ).all()
-
-            # Filter items without enrollment
-            pending_items = []
-            for item in plan_items:
-                if not any(e.course_id == item.course_id for e in enrollments):
-                    pending_items.append(item)
+        # Filter planned items without enrollment
+        enrolled_refs = set(e.course_id_ref for e in enrollments)
+        pending_items = [
+            item for item in plan_items
+            if item.estado_plan == "planned" and item.course_id_ref not in enrolled_refs
+        ]
 
         if pending_items:
             st.write(f"Se pueden crear {len(pending_items)} inscripciones desde el plan planned:")
 
             if st.button("Crear todas las inscripciones planned", key="bulk_create"):
-                created_count = 0
                 with get_session() as session:
-                    for item in pending_items:
-                        enroll = Enrollment(
-                            student_id=selected_student.student_id,
-                            course_id=item.course_id,
-                            status="planned",
-                            nota_numerica=None,
-                            fecha_registro=datetime.now(),
-                            fecha_estado=None,
-                        )
-                        session.add(enroll)
-                        session.flush()
-                        created_count += 1
-                        log_change("Enrollment", str(enroll.id), "creacion", None, f"{item.course_id} (planned)", motivo="Creado desde plan_version", user=user_name)
-
-                    session.commit()
+                    # Enrollments and their ChangeLog rows in one transaction
+                    with audit_batch(session, user=user_name, motivo="Creado desde plan_version"):
+                        new_enrollments = [
+                            Enrollment(
+                                student_id=selected_student.student_id,
+                                course_id_ref=item.course_id_ref,
+                                course_id=item.course_id,
+                                status="planned",
+                                nota_numerica=None,
+                                fecha_registro=datetime.now(),
+                                fecha_estado=None,
+                            )
+                            for item in pending_items
+                        ]
+                        session.add_all(new_enrollments)
+                    created_count = len(new_enrollments)
 
                 st.success(f"✅ {created_count} inscripciones creadas")
                 st.rerun()
@@ -212,8 +185,7 @@ def run():
     st.markdown("---")
     st.subheader("➕ Agregar o Editar Inscripción")
 
-    with get_session() as session:
-        all_courses = session.query(Course).all()
+    all_courses = list_courses()
 
     if all_courses:
         # Filter to show only courses not yet enrolled (or allow editing)
@@ -250,9 +222,8 @@ def run():
             with col_upd:
                 if st.button("Actualizar Inscripción", key="update_enroll"):
                     with get_session() as session:
+                        enable_audit(session, user=user_name, motivo="Actualización manual")
                         enroll = session.get(Enrollment, existing_enroll.id)
-                        old_status = enroll.status
-
                         enroll.status = status
                         enroll.nota = nota_text if nota_text else None
                         enroll.nota_numerica = nota_numerica if nota_numerica else None
@@ -261,19 +232,16 @@ def run():
 
                         session.commit()
 
-                    if old_status != status:
-                        log_change("Enrollment", str(existing_enroll.id), "status", old_status, status, motivo="Actualización manual", user=user_name)
-
                     st.success("✅ Inscripción actualizada")
                     st.rerun()
 
             with col_del:
                 if st.button("Eliminar Inscripción", key="del_enroll"):
                     with get_session() as session:
+                        enable_audit(session, user=user_name, motivo="Eliminada manualmente")
                         session.delete(session.get(Enrollment, existing_enroll.id))
                         session.commit()
 
-                    log_change("Enrollment", str(existing_enroll.id), "eliminacion", status, None, motivo="Eliminada manualmente", user=user_name)
                     st.success("✅ Inscripción eliminada")
                     st.rerun()
 
@@ -281,6 +249,7 @@ def run():
             # Create new enrollment
             if st.button("Crear Inscripción", key="create_enroll"):
                 with get_session() as session:
+                    enable_audit(session, user=user_name, motivo="Creada manualmente")
                     enroll = Enrollment(
                         student_id=selected_student.student_id,
                         course_id_ref=selected_course.id,
@@ -292,10 +261,8 @@ def run():
                         fecha_estado=fecha_estado if fecha_estado else None,
                     )
                     session.add(enroll)
-                    session.flush()
                     session.commit()
 
-                log_change("Enrollment", str(enroll.id), "creacion", None, f"{selected_course.course_id} ({status})", motivo="Creada manualmente", user=user_name)
                 st.success(f"✅ Inscripción en {selected_course.materia} creada")
                 st.rerun()
 
@@ -303,8 +270,7 @@ def run():
     st.markdown("---")
     st.subheader("📊 Sumario de Inscripciones")
 
-    with get_session() as session:
-        enrolls = session.query(Enrollment).filter_by(student_id=selected_student.student_id).all()
+    enrolls = enrollments
 
     if enrolls:
         status_counts = {}
@@ -318,17 +284,16 @@ def run():
 
         # Summary table
         enroll_summaries = []
-        with get_session() as session:
-            for e in enrolls:
-                course = session.get(Course, e.course_id)
-                enroll_summaries.append({
-                    "Materia": course.materia if course else e.course_id,
-                    "Estado": e.status,
-                    "Nota Numérica": e.nota_numerica or "-",
-                    "Nota Texto": e.nota or "-",
-                    "Fecha Registro": e.fecha_registro.date() if e.fecha_registro else "-",
-                    "Fecha Estado": e.fecha_estado.date() if e.fecha_estado else "-",
-                })
+        for e in enrolls:
+            course = e.course
+            enroll_summaries.append({
+                "Materia": course.materia if course else e.course_id,
+                "Estado": e.status,
+                "Nota Numérica": e.nota_numerica or "-",
+                "Nota Texto": e.nota or "-",
+                "Fecha Registro": e.fecha_registro.date() if e.fecha_registro else "-",
+                "Fecha Estado": e.fecha_estado.date() if e.fecha_estado else "-",
+            })
 
         df_enrolls = pd.DataFrame(enroll_summaries)
         st.dataframe(df_enrolls, use_container_width=True)
@@ -339,7 +304,7 @@ def run():
     st.markdown("---")
     st.subheader("🎯 Progreso Regla 5/8")
 
-    ok, best_orient, best_count = check_rule_5_of_8(selected_student.student_id)
+    ok, best_orient, best_count = snapshot.rule_5_of_8()
 
     col_ok, col_orient, col_count = st.columns(3)
 
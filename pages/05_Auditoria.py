@@ -2,8 +2,9 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 
-from lib import get_session, init_db
-from lib.models import ChangeLog, Student
+from lib import init_db
+from lib.audit import archived_months, audit_count, audit_page, audit_stats
+from lib.cache import list_students
 
 
 def run():
@@ -17,6 +18,9 @@ def run():
     st.markdown("---")
     st.subheader("🔎 Filtros")
 
+    # Users and entities present in the log (exact values, served by the indexes)
+    stats = audit_stats()
+
     col_f1, col_f2, col_f3, col_f4 = st.columns(4)
 
     with col_f1:
@@ -26,64 +30,60 @@ def run():
         fecha_hasta = st.date_input("Hasta", value=datetime.now(), key="audit_hasta")
 
     with col_f3:
-        user_filter = st.text_input("Usuario (contiene)", value="", key="audit_user")
+        user_filter = st.selectbox("Usuario", [""] + sorted(stats["by_user"]), key="audit_user")
 
     with col_f4:
-        entidad_filter = st.text_input("Entidad (contiene)", value="", key="audit_entidad")
+        entidad_filter = st.selectbox("Entidad", [""] + sorted(stats["by_entidad"]), key="audit_entidad")
 
     # Get students for filter
-    with get_session() as session:
-        all_students = session.query(Student).all()
+    all_students = list_students()
 
     student_map = {f"{s.nombre} {s.apellido} ({s.email})": s.student_id for s in all_students}
     student_filter_label = st.selectbox("Estudiante (opcional)", [""] + list(student_map.keys()), key="audit_student")
     student_filter_id = student_map.get(student_filter_label) if student_filter_label else None
 
-    # ===== SECTION: Fetch and Filter Logs =====
-    with get_session() as session:
-        query = session.query(ChangeLog)
-
-        # Date range filter
-        query = query.filter(
-            ChangeLog.ts >= datetime.combine(fecha_desde, datetime.min.time()),
-            ChangeLog.ts <= datetime.combine(fecha_hasta, datetime.max.time()),
-        )
-
-        # User filter
-        if user_filter:
-            query = query.filter(ChangeLog.user.ilike(f"%{user_filter}%"))
+    col_p1, _ = st.columns([1, 3])
+    with col_p1:
+        page_size = st.selectbox("Filas por página", [50, 100, 200], index=1, key="audit_page_size")
 
-        # Entidad filter
-        if entidad_filter:
-            query = query.filter(ChangeLog.entidad.ilike(f"%{entidad_filter}%"))
-
-        # Student filter (by entidad_id if it's a student ID or by matching enrollments/plans)
-        if student_filter_id:
-            # Filter logs that reference this student
-            query = query.filter(
-                (ChangeLog.entidad_id == str(student_filter_id)) |
-                (ChangeLog.entidad == "Student")
-            )
-
-        # Order by timestamp descending
-        logs = query.order_by(ChangeLog.ts.desc()).all()
+    # ===== SECTION: Fetch and Filter Logs =====
+    filters = {
+        "desde": datetime.combine(fecha_desde, datetime.min.time()),
+        "hasta": datetime.combine(fecha_hasta, datetime.max.time()),
+        "user": user_filter,
+        "entidad": entidad_filter,
+        "student_id": student_filter_id,
+    }
+
+    # Keyset pagination: stack of page-start cursors, reset when filters change
+    filters_key = (tuple(filters.items()), page_size)
+    if st.session_state.get("audit_filters_key") != filters_key:
+        st.session_state["audit_filters_key"] = filters_key
+        st.session_state["audit_cursors"] = [None]
+    cursors = st.session_state["audit_cursors"]
+
+    logs, next_cursor = audit_page(filters, cursors[-1], page_size)
+    total = audit_count(filters)
 
     # ===== SECTION: Display Logs Table =====
     st.markdown("---")
-    st.subheader(f"📋 Registros de Cambios ({len(logs)} resultados)")
+    st.subheader(f"📋 Registros de Cambios ({total} resultados)")
+    months = archived_months(filters["desde"], filters["hasta"])
+    if months:
+        st.caption(f"Incluye registros archivados de {len(months)} mes(es) ({months[-1]} a {months[0]})")
 
     if logs:
         log_data = []
         for log in logs:
             log_data.append({
-                "Timestamp": log.ts,
-                "Usuario": log.user or "-",
-                "Entidad": log.entidad,
-                "Entidad ID": log.entidad_id or "-",
-                "Campo": log.campo or "-",
-                "Valor Anterior": log.valor_anterior or "-",
-                "Valor Nuevo": log.valor_nuevo or "-",
-                "Motivo": log.motivo or "-",
+                "Timestamp": log["ts"],
+                "Usuario": log["user"] or "-",
+                "Entidad": log["entidad"],
+                "Entidad ID": log["entidad_id"] or "-",
+                "Campo": log["campo"] or "-",
+                "Valor Anterior": log["valor_anterior"] or "-",
+                "Valor Nuevo": log["valor_nuevo"] or "-",
+                "Motivo": log["motivo"] or "-",
             })
 
         df_logs = pd.DataFrame(log_data)
@@ -93,10 +93,24 @@ def run():
 
         st.dataframe(df_logs, use_container_width=True)
 
+        # Page navigation
+        first_row = (len(cursors) - 1) * page_size + 1
+        col_prev, col_pos, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if st.button("◀ Anterior", disabled=len(cursors) == 1, key="audit_prev"):
+                cursors.pop()
+                st.rerun()
+        with col_pos:
+            st.caption(f"Página {len(cursors)} · registros {first_row}–{first_row + len(logs) - 1} de {total}")
+        with col_next:
+            if st.button("Siguiente ▶", disabled=next_cursor is None, key="audit_next"):
+                cursors.append(next_cursor)
+                st.rerun()
+
         # Export button
         csv = df_logs.to_csv(index=False).encode("utf-8")
         st.download_button(
-            "📥 Descargar como CSV",
+            "📥 Descargar página como CSV",
             data=csv,
             file_name=f"auditoria_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
             mime="text/csv",
@@ -108,40 +122,32 @@ def run():
     st.markdown("---")
     st.subheader("📊 Estadísticas")
 
-    with get_session() as session:
-        all_logs = session.query(ChangeLog).all()
-
-        if all_logs:
-            # Count by entidad
-            entidad_counts = {}
-            user_counts = {}
-            for log in all_logs:
-                entidad_counts[log.entidad] = entidad_counts.get(log.entidad, 0) + 1
-                if log.user:
-                    user_counts[log.user] = user_counts.get(log.user, 0) + 1
+    if stats["total"]:
+        entidad_counts = stats["by_entidad"]
+        user_counts = stats["by_user"]
 
-            col_stat1, col_stat2, col_stat3 = st.columns(3)
+        col_stat1, col_stat2, col_stat3 = st.columns(3)
 
-            with col_stat1:
-                st.metric("Total Cambios", len(all_logs))
+        with col_stat1:
+            st.metric("Total Cambios", stats["total"])
 
-            with col_stat2:
-                st.metric("Usuarios Únicos", len(user_counts))
+        with col_stat2:
+            st.metric("Usuarios Únicos", len(user_counts))
 
-            with col_stat3:
-                st.metric("Entidades Auditadas", len(entidad_counts))
+        with col_stat3:
+            st.metric("Entidades Auditadas", len(entidad_counts))
 
-            # Charts
-            col_chart1, col_chart2 = st.columns(2)
+        # Charts
+        col_chart1, col_chart2 = st.columns(2)
 
-            with col_chart1:
-                st.write("#### Cambios por Entidad")
-                df_entidad = pd.DataFrame(sorted(entidad_counts.items(), key=lambda x: x[1], reverse=True), columns=["Entidad", "Cantidad"])
-                st.bar_chart(df_entidad.set_index("Entidad"))
+        with col_chart1:
+            st.write("#### Cambios por Entidad")
+            df_entidad = pd.DataFrame(list(entidad_counts.items()), columns=["Entidad", "Cantidad"])
+            st.bar_chart(df_entidad.set_index("Entidad"))
 
-            with col_chart2:
-                st.write("#### Cambios por Usuario")
-                df_user = pd.DataFrame(sorted(user_counts.items(), key=lambda x: x[1], reverse=True), columns=["Usuario", "Cantidad"])
-                st.bar_chart(df_user.set_index("Usuario"))
+        with col_chart2:
+            st.write("#### Cambios por Usuario")
+            df_user = pd.DataFrame(list(user_counts.items()), columns=["Usuario", "Cantidad"])
+            st.bar_chart(df_user.set_index("Usuario"))
 
 run()
\ No newline at end of file
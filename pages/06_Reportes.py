@@ -3,9 +3,10 @@ import pandas as pd
 from datetime import datetime
 from io import BytesIO
 
-from lib import get_session, init_db
-from lib.models import Student, Course, CourseSource, PlanVersion, StudentPlanItem, Enrollment
-from lib.metrics import check_rule_5_of_8, elective_counts_by_orientation, risk_score
+from lib import init_db
+from lib.cache import list_students
+from lib.catalog import catalog_facets
+from lib.metrics import course_demand, elective_counts_by_student, risk_scores, temporal_demand
 
 
 def run():
@@ -24,10 +25,10 @@ def run():
         # Filters
         col_f1, col_f2, col_f3 = st.columns(3)
 
-        with get_session() as session:
-            programas = sorted(set(c.programa for c in session.query(Course).all() if c.programa))
-            anos = sorted(set(c.anio for c in session.query(Course).all() if c.anio))
-            orientaciones = sorted(set(c.orientacion for c in session.query(Course).all() if c.orientacion))
+        facets = catalog_facets()
+        programas = list(facets["programa"])
+        anos = list(facets["anio"])
+        orientaciones = list(facets["orientacion"])
 
         with col_f1:
             filt_programa = st.selectbox("Programa", [""] + programas, key="demand_prog")
@@ -36,152 +37,102 @@ def run():
         with col_f3:
             filt_orientacion = st.selectbox("Orientación", [""] + orientaciones, key="demand_orient")
 
-        # Calculate demand
-        with get_session() as session:
-            planned_items = session.query(StudentPlanItem, Course, PlanVersion).join(
-                Course, StudentPlanItem.course_id_ref == Course.id
-            ).join(
-                PlanVersion, StudentPlanItem.plan_version_id == PlanVersion.id
-            ).filter(
-                StudentPlanItem.estado_plan == "planned",
-                PlanVersion.vigente_hasta.is_(None),  # Only vigente plans
-            ).all()
-
-            # Count by course
-            course_demand = {}
-            for item, course, plan in planned_items:
-                # Apply filters
-                if filt_programa and course.programa != filt_programa:
-                    continue
-                if filt_ano and str(course.anio) != filt_ano:
-                    continue
-                if filt_orientacion and course.orientacion != filt_orientacion:
-                    continue
-
-                key = course.course_id
-                if key not in course_demand:
-                    course_demand[key] = {
-                        "MateriaID": course.course_id,
-                        "Materia": course.materia,
-                        "Programa": course.programa,
-                        "Año": course.anio,
-                        "Tipo": course.tipo_materia,
-                        "Orientación": course.orientacion or "N/A",
-                        "Estudiantes Planned": 0,
-                    }
-                course_demand[key]["Estudiantes Planned"] += 1
-
-            # Convert to dataframe
-            if course_demand:
-                df_demand = pd.DataFrame(list(course_demand.values()))
-                df_demand = df_demand.sort_values("Estudiantes Planned", ascending=False)
-                st.dataframe(df_demand, use_container_width=True)
-
-                # Export buttons
-                col_csv, col_excel = st.columns(2)
-                with col_csv:
-                    csv = df_demand.to_csv(index=False).encode("utf-8")
-                    st.download_button(
-                        "📥 Descargar CSV",
-                        data=csv,
-                        file_name=f"demanda_cursos_{datetime.now().strftime('%Y%m%d')}.csv",
-                        mime="text/csv",
-                        key="demand_csv"
-                    )
-                with col_excel:
-                    # Create Excel file
-                    output = BytesIO()
-                    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                        df_demand.to_excel(writer, sheet_name="Demanda", index=False)
-                    output.seek(0)
-                    st.download_button(
-                        "📥 Descargar Excel",
-                        data=output.getvalue(),
-                        file_name=f"demanda_cursos_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        key="demand_excel"
-                    )
-            else:
-                st.info("No hay demanda con los filtros seleccionados.")
+        # Filtered and counted in the database
+        course_demand_df = course_demand({
+            "programa": filt_programa,
+            "anio": filt_ano,
+            "orientacion": filt_orientacion,
+        })
+
+        if not course_demand_df.empty:
+            df_demand = course_demand_df.assign(
+                orientacion=course_demand_df["orientacion"].fillna("N/A")
+            ).rename(columns={
+                "course_id": "MateriaID",
+                "materia": "Materia",
+                "programa": "Programa",
+                "anio": "Año",
+                "tipo_materia": "Tipo",
+                "orientacion": "Orientación",
+                "planned_students": "Estudiantes Planned",
+            })
+            st.dataframe(df_demand, use_container_width=True)
+
+            # Export buttons
+            col_csv, col_excel = st.columns(2)
+            with col_csv:
+                csv = df_demand.to_csv(index=False).encode("utf-8")
+                st.download_button(
+                    "📥 Descargar CSV",
+                    data=csv,
+                    file_name=f"demanda_cursos_{datetime.now().strftime('%Y%m%d')}.csv",
+                    mime="text/csv",
+                    key="demand_csv"
+                )
+            with col_excel:
+                # Create Excel file
+                output = BytesIO()
+                with pd.ExcelWriter(output, engine="openpyxl") as writer:
+                    df_demand.to_excel(writer, sheet_name="Demanda", index=False)
+                output.seek(0)
+                st.download_button(
+                    "📥 Descargar Excel",
+                    data=output.getvalue(),
+                    file_name=f"demanda_cursos_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="demand_excel"
+                )
+        else:
+            st.info("No hay demanda con los filtros seleccionados.")
 
     # ===== TAB 2: Demanda Temporal =====
     with tab2:
         st.subheader("📅 Demanda por Mes/Módulo")
         st.write("Distribución de demanda según módulo y mes de inicio de los cursos.")
 
-        with get_session() as session:
-            # Get course sources with module info
-            sources = session.query(CourseSource, Course).join(
-                Course, CourseSource.course_id_ref == Course.id
-            ).all()
-
-            # Count demand by source
-            demand_temporal = {}
-            for source, course in sources:
-                # Check if any planned student has this course
-                planned_count = session.query(StudentPlanItem).filter(
-                    StudentPlanItem.course_id_ref == course.id,
-                    StudentPlanItem.estado_plan == "planned",
-                ).count()
-
-                if planned_count > 0:
-                    modulo = source.modulo or "Sin módulo"
-                    mes = "Sin fecha"
-                    if course.inicio:
-                        mes = course.inicio.strftime("%B %Y")
-
-                    key = (modulo, mes)
-                    if key not in demand_temporal:
-                        demand_temporal[key] = 0
-                    demand_temporal[key] += planned_count
-
-            if demand_temporal:
-                df_temporal = pd.DataFrame([
-                    {"Módulo": k[0], "Mes Inicio": k[1], "Demanda": v}
-                    for k, v in sorted(demand_temporal.items(), key=lambda x: x[1], reverse=True)
-                ])
-                st.dataframe(df_temporal, use_container_width=True)
-
-                # Chart
-                st.bar_chart(df_temporal.set_index("Mes Inicio")["Demanda"])
-
-                # Export
-                csv = df_temporal.to_csv(index=False).encode("utf-8")
-                st.download_button(
-                    "📥 Descargar CSV",
-                    data=csv,
-                    file_name=f"demanda_temporal_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv",
-                    key="temporal_csv"
-                )
-            else:
-                st.info("Sin información temporal disponible.")
+        # One grouped aggregate over sources, courses and planned items
+        demand_temporal = temporal_demand()
+
+        if not demand_temporal.empty:
+            df_temporal = demand_temporal.rename(columns={
+                "modulo": "Módulo", "mes_inicio": "Mes Inicio", "demanda": "Demanda",
+            })
+            st.dataframe(df_temporal, use_container_width=True)
+
+            # Chart
+            st.bar_chart(df_temporal.set_index("Mes Inicio")["Demanda"])
+
+            # Export
+            csv = df_temporal.to_csv(index=False).encode("utf-8")
+            st.download_button(
+                "📥 Descargar CSV",
+                data=csv,
+                file_name=f"demanda_temporal_{datetime.now().strftime('%Y%m%d')}.csv",
+                mime="text/csv",
+                key="temporal_csv"
+            )
+        else:
+            st.info("Sin información temporal disponible.")
 
     # ===== TAB 3: Cumplimiento =====
     with tab3:
         st.subheader("✅ Cumplimiento - Regla 5/8")
 
-        with get_session() as session:
-            all_students = session.query(Student).all()
+        all_students = list_students()
 
         if not all_students:
             st.info("No hay estudiantes registrados.")
         else:
-            # Calculate metrics
-            rule_58_compliant = 0
-            total_electives_completed = []
-            orientation_distribution = {}
-
-            for student in all_students:
-                ok, best_orient, best_count = check_rule_5_of_8(student.student_id)
-                if ok:
-                    rule_58_compliant += 1
+            # Calculate metrics (one grouped query for every student)
+            counts = elective_counts_by_student([s.student_id for s in all_students])
+            df_scores = risk_scores(counts=counts)
+            rule_58_compliant = int((df_scores["gap_to_target"] == 0).sum())
+            total_electives_completed = df_scores["total_completed"].tolist()
 
-                counts = elective_counts_by_orientation(student.student_id)
-                if counts:
-                    total_electives_completed.append(sum(counts.values()))
-                    for orient, count in counts.items():
-                        orientation_distribution[orient] = orientation_distribution.get(orient, 0) + count
+            orientation_distribution = {}
+            for by_orient in counts.values():
+                for orient, count in by_orient.items():
+                    orientation_distribution[orient] = orientation_distribution.get(orient, 0) + count
 
             # KPI Metrics
             col_kpi1, col_kpi2, col_kpi3, col_kpi4 = st.columns(4)
@@ -227,24 +178,24 @@ def run():
         st.subheader("⚠️ Estudiantes en Riesgo")
         st.write("Análisis de estudiantes que no cumplen la regla 5/8 o están cerca del limite.")
 
-        with get_session() as session:
-            all_students = session.query(Student).all()
+        all_students = list_students()
 
         if not all_students:
             st.info("No hay estudiantes registrados.")
         else:
+            df_scores = risk_scores([s.student_id for s in all_students])
             risk_data = []
 
             for student in all_students:
-                ok, best_orient, best_count = check_rule_5_of_8(student.student_id)
-                risk = risk_score(student.student_id)
+                risk = df_scores.loc[student.student_id]
+                ok = risk["gap_to_target"] == 0
 
                 risk_data.append({
                     "Estudiante": f"{student.nombre} {student.apellido}",
                     "Email": student.email,
                     "Programa": student.programa,
                     "Cohorte": student.cohorte or "N/A",
-                    "Orientación Objetivo": best_orient or "N/A",
+                    "Orientación Objetivo": risk["best_orientation"] or "N/A",
                     "Electivas Completadas": risk["total_completed"],
                     "Mejor Count": risk["best_count"],
                     "Gap a 5": risk["gap_to_target"],
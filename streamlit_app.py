@@ -23,7 +23,7 @@ db_path = Path("data/app.db")
 st.sidebar.write(f"DB: `{db_path}`")
 
 if st.sidebar.button("🔄 Inicializar DB"):
-    init_db()
+    init_db(force=True)
     st.sidebar.success("DB inicializada")
     st.rerun()
 